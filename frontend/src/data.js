@@ -56,13 +56,24 @@ function humanReadableSeconds(seconds) {
     return prefix + result.join(", ");
 }
 
+function decodeLabels({epoch, offsets}) {
+    const start = Date.parse(epoch);
+    return offsets.map((offset) => new Date(start + offset * 24 * 60 * 60 * 1000).toISOString().slice(0, 10));
+}
+
 (async function () {
+    const labels = decodeLabels(require('./data/labels.json'));
+
     function transparentize(value, opacity) {
         const alpha = opacity === undefined ? 0.5 : 1 - opacity;
         return colorLib(value).alpha(alpha).rgbString();
     }
 
     function dumpDiagram(id, data) {
+        // compact configs share the labels, downsampled ones only use some of them
+        if (!data.data.labels) {
+            data.data.labels = data.data.labelIndices ? data.data.labelIndices.map((i) => labels[i]) : labels;
+        }
         data.data.datasets = data.data.datasets.map((dataset) => ({
             ...dataset,
             "backgroundColor": transparentize(dataset.borderColor, 0.5),
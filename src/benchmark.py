@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import List, Dict, Optional
+
+from lib.chart_js import ChartJsJsonGenerator
+from lib.decoder import Decoder, BACKENDS
+from lib.factory import LoggerFactory
+from lib.model import Response
+from lib.repository import (
+    FollowerRepository,
+    ListenerRepository,
+    EngagedListenerRepository,
+    ConsumptionRepository,
+    StreamRepository,
+    StreamStartRepository,
+    RepositoryIndex,
+)
+from lib.responses import ResponseManager
+from lib.synthetic import SyntheticDataGenerator
+from lib.validator import Validator
+from normalizer.transformer import Transformer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class StageTimer:
+    """
+    records duration and, with `trace_memory`, the peak of additionally allocated memory of every stage
+    """
+
+    def __init__(self, logger: logging.Logger, trace_memory: bool):
+        self._logger = logger
+        self._trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Optional[float]]] = {}
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        allocated = 0
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - allocated if self._trace_memory else None
+        self.stages[name] = {"seconds": seconds, "peak_bytes": peak}
+        peak_info = f", peak {peak / 1024 / 1024:.1f} MiB" if peak is not None else ""
+        self._logger.info(f"Stage {name}: {seconds:.3f}s{peak_info}")
+
+    @staticmethod
+    def max_rss_kib() -> Optional[int]:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+
+def benchmark_normalization(logger: logging.Logger, responses: List[Response], processes: int):
+    start = time.perf_counter()
+    serial = Transformer(logger).normalize(responses)
+    serial_seconds = time.perf_counter() - start
+    logger.info(f"Serial normalization: {serial_seconds:.3f}s")
+
+    start = time.perf_counter()
+    parallel = Transformer(logger, processes=processes).normalize(responses)
+    parallel_seconds = time.perf_counter() - start
+    logger.info(
+        f"Parallel normalization: {parallel_seconds:.3f}s ({serial_seconds / parallel_seconds:.2f}x speedup)"
+    )
+
+    if parallel != serial:
+        raise RuntimeError("Parallel normalization differs from serial normalization.")
+
+
+def benchmark_decoding(logger: logging.Logger, responses: List[Response], transformer: Transformer):
+    by_route = defaultdict(list)
+    for response in responses:
+        strategy = transformer.route(response)
+        by_route[(strategy.provider().value, strategy.route(response.meta))].append(
+            (strategy.schema(response.meta), response.data)
+        )
+
+    logger.info(
+        f"{'provider':<10}{'route':<40}{'backend':<10}{'count':>7}{'MiB':>9}{'dict ms':>10}{'typed ms':>10}"
+    )
+    for (provider, route), payloads in sorted(by_route.items()):
+        size = sum(len(data) for _, data in payloads) / 1024 / 1024
+        for backend in BACKENDS:
+            if not Decoder.available(backend):
+                continue
+            decoder = Decoder(backend)
+            start = time.perf_counter()
+            for _, data in payloads:
+                decoder.decode(data)
+            generic_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for schema, data in payloads:
+                if schema is not None:
+                    decoder.decode_as(data, schema)
+            typed_ms = (time.perf_counter() - start) * 1000
+            logger.info(
+                f"{provider:<10}{route[-39:]:<40}{backend:<10}{len(payloads):>7}{size:>9.2f}"
+                f"{generic_ms:>10.1f}{typed_ms:>10.1f}"
+            )
+
+
+def benchmark_pipeline(
+    logger: logging.Logger,
+    response_manager: ResponseManager,
+    transformer: Transformer,
+    columnar: bool,
+    trace_memory: bool,
+    show: Optional[str] = None,
+) -> Dict:
+    """
+    runs the stages of `process.py` one after another, chart configs are serialized but not written
+    """
+    validator = Validator(logger)
+    timer = StageTimer(logger, trace_memory)
+    with timer.stage("find"):
+        responses = list(response_manager.find(ordered=False, show=show))
+    with timer.stage("fold"):
+        folded = transformer.fold(responses)
+    with timer.stage("finalize"):
+        by_provider = transformer.finalize_columnar(folded) if columnar else transformer.finalize(folded)
+    with timer.stage("flip"):
+        by_date = transformer.provider_to_date_flip(
+            by_provider.to_data_points() if columnar else by_provider
+        )
+    with timer.stage("validate"):
+        if columnar:
+            validator.validate_columnar(by_provider)
+        else:
+            validator.validate(by_provider)
+    with timer.stage("chart"):
+        repository_index = RepositoryIndex(by_provider)
+        chart_generator = ChartJsJsonGenerator(transformer)
+        configs = [
+            chart_generator.generate(label, repository_cls(by_provider, repository_index), [])
+            for label, repository_cls in [
+                ("Follower Count", FollowerRepository),
+                ("Listener Count", ListenerRepository),
+                ("Engaged Listener Count", EngagedListenerRepository),
+                ("Consumption Seconds", ConsumptionRepository),
+                ("Stream Count", StreamRepository),
+                ("Stream Starts", StreamStartRepository),
+            ]
+        ]
+    with timer.stage("serialize"):
+        size = sum(len(json.dumps(config, indent=4)) for config in configs)
+
+    report = {
+        "responses": len(responses),
+        "dates": len(by_date),
+        "chart_bytes": size,
+        "columnar": columnar,
+        "stages": timer.stages,
+        "total_seconds": sum(stage["seconds"] for stage in timer.stages.values()),
+        "max_rss_kib": timer.max_rss_kib(),
+    }
+    logger.info(
+        f"Pipeline over {len(responses)} response(s) and {len(by_date)} date(s): "
+        f"{report['total_seconds']:.3f}s, max RSS {report['max_rss_kib']} KiB"
+    )
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", "-d", action="store_true")
+    parser.add_argument("--meta-dir", default=os.getenv("META_DIR"))
+    parser.add_argument("--payload-dir", default=os.getenv("PAYLOAD_DIR"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    normalization_parser = subparsers.add_parser(
+        "normalization", help="compare serial and multi-core normalization"
+    )
+    normalization_parser.add_argument(
+        "--normalization-processes", type=int, default=0, help="0 uses all cores"
+    )
+    subparsers.add_parser("decoding", help="time decoding per route and JSON backend")
+    generate_parser = subparsers.add_parser(
+        "generate", help="write synthetic responses to the meta and payload directory"
+    )
+    generate_parser.add_argument("--years", type=float, default=1)
+    generate_parser.add_argument("--scrapes-per-week", type=float, default=1)
+    generate_parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    generate_parser.add_argument("--shows", type=int, default=1)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument(
+        "--end", type=datetime.date.fromisoformat, help="last day of history, defaults to today"
+    )
+    generate_parser.add_argument(
+        "--window-days", type=int, help="every scrape after the first one only covers that many days"
+    )
+    pipeline_parser = subparsers.add_parser("pipeline", help="time every stage of process.py")
+    pipeline_parser.add_argument("--columnar", action="store_true")
+    pipeline_parser.add_argument(
+        "--trace-memory", action="store_true", help="report peak memory per stage, slows down all stages"
+    )
+    pipeline_parser.add_argument("--report-file-name", help="write the stage timings as JSON")
+    pipeline_parser.add_argument("--show", help="only process responses tagged with this show")
+    args = parser.parse_args()
+
+    logger = LoggerFactory.get(args.debug)
+    response_manager = ResponseManager(args.meta_dir, args.payload_dir)
+
+    if args.command == "generate":
+        SyntheticDataGenerator(
+            logger,
+            response_manager,
+            years=args.years,
+            scrapes_per_week=args.scrapes_per_week,
+            duplicate_ratio=args.duplicate_ratio,
+            shows=args.shows,
+            seed=args.seed,
+            end=args.end,
+            window_days=args.window_days,
+        ).generate()
+    elif args.command == "pipeline":
+        report = benchmark_pipeline(
+            logger, response_manager, Transformer(logger), args.columnar, args.trace_memory, args.show
+        )
+        if args.report_file_name:
+            with open(args.report_file_name, "w") as fp:
+                json.dump(report, fp, indent=4)
+            logger.info(f"Wrote {args.report_file_name}.")
+    else:
+        responses = list(response_manager.find())
+        logger.info(f"Loaded {len(responses)} response(s).")
+        if args.command == "normalization":
+            benchmark_normalization(logger, responses, args.normalization_processes)
+        elif args.command == "decoding":
+            benchmark_decoding(logger, responses, Transformer(logger))
+
+
+if __name__ == "__main__":
+    main()
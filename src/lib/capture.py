@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import base64
+import collections
+import json
+import logging
+import re
+import time
+from json import JSONDecodeError
+from typing import Callable, Dict, List, Optional, Iterable, Deque
+
+from selenium.common import WebDriverException
+
+from lib.model import Response
+
+# matched against the raw text of log entries, so only entries which are needed get decoded
+RESPONSE_RECEIVED = '"Network.responseReceived"'
+LOADING_FINISHED = '"Network.loadingFinished"'
+LOADING_FAILED = '"Network.loadingFailed"'
+REQUEST_ID = re.compile(r'"requestId":\s*"([^"]+)"')
+
+
+class ResponseCapture:
+    """
+    turns the performance log of a browser into a stream of the responses with a URL matching `url_pattern`
+
+    Entries are matched against the raw log text first and only decoded if they can belong to a matching
+    response. Bodies are requested as soon as loading finished, before Chrome evicts them, by the polling
+    thread itself, as the driver handles one command at a time and must not be shared between threads. At
+    most `max_pending` matching requests which haven't finished loading are tracked, the oldest ones are
+    dropped beyond that.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        selenium,
+        url_pattern: str,
+        read_log: Optional[Callable[[], List[Dict]]] = None,
+        max_pending: int = 256,
+        name: Optional[str] = None,
+    ):
+        self._logger = logger
+        self._selenium = selenium
+        self._url_pattern = re.compile(url_pattern)
+        self._read_log = read_log or (lambda: selenium.get_log("performance"))
+        self._max_pending = max_pending
+        self._name = name or self.__class__.__name__
+        # request id to URL of matching responses which haven't finished loading yet
+        self._pending: collections.OrderedDict[str, str] = collections.OrderedDict()
+        # responses whose body has been read but which haven't been yielded yet
+        self._completed: Deque[Response] = collections.deque()
+        self.dropped = 0
+
+    def __enter__(self) -> "ResponseCapture":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.dropped:
+            self._logger.warning(f"{self._name} ➤ Dropped {self.dropped} unfinished request(s).")
+
+    def poll(self) -> List[str]:
+        """
+        reads all new log entries, requests the bodies of matching responses which finished loading and
+        returns their URLs
+        """
+        finished = []
+        for entry in self._read_log():
+            raw = entry["message"]
+            if RESPONSE_RECEIVED in raw:
+                if self._url_pattern.search(raw) is not None:
+                    self._track(json.loads(raw)["message"]["params"])
+            elif LOADING_FINISHED in raw or LOADING_FAILED in raw:
+                match = REQUEST_ID.search(raw)
+                url = self._pending.pop(match.group(1), None) if match is not None else None
+                if url is None or LOADING_FAILED in raw:
+                    continue
+                body = self._body(match.group(1))
+                if body is not None:
+                    self._completed.append(Response.from_dict(body, url))
+                finished.append(url)
+
+        return finished
+
+    def stream(self, expected: Iterable[str] = (), timeout: float = 10) -> Iterable[Response]:
+        """
+        yields responses as they finish loading until, for every regular expression in `expected`, a matching
+        response finished loading, or until `timeout`
+
+        Only responses which finish after the call count, so call this right after the click which triggers
+        them. Without `expected`, everything which finished until now is yielded.
+        """
+        missing = [re.compile(pattern) for pattern in expected]
+        deadline = time.monotonic() + timeout
+        while True:
+            for url in self.poll():
+                missing = [pattern for pattern in missing if not pattern.search(url)]
+            while self._completed:
+                yield self._completed.popleft()
+            if not missing or time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        for pattern in missing:
+            self._logger.warning(f"{self._name} ➤ No response matching {pattern.pattern} within {timeout}s.")
+
+    def _track(self, params: Dict):
+        url = params["response"]["url"]
+        # the raw text may have matched a header or the initiator
+        if self._url_pattern.search(url) is None:
+            return
+        self._pending[params["requestId"]] = url
+        if len(self._pending) > self._max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+
+    def _body(self, request_id: str) -> Optional[Dict]:
+        try:
+            body = self._selenium.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except WebDriverException as e:
+            self._logger.debug(f"{self._name} ➤ No body for request {request_id}: {e}")
+            return None
+        text = base64.b64decode(body["body"]) if body.get("base64Encoded") else body["body"]
+        try:
+            return json.loads(text)
+        except (JSONDecodeError, UnicodeDecodeError):
+            return None
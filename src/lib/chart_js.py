@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import bisect
 from typing import Dict, Optional, List, Iterable
 
 from lib.model import PROVIDER_COLORS, Event
 from lib.repository import AbstractRepository
+from lib.series import largest_triangle_three_buckets, to_ordinal
 from normalizer.transformer import Transformer
 
 
 class ChartJsJsonGenerator:
-    def __init__(self, transformer: Transformer):
+    def __init__(
+        self, transformer: Transformer, shared_labels: bool = False, max_points: Optional[int] = None
+    ):
+        """
+        with `shared_labels`, configs don't contain the labels, see `labels`, and with `max_points`, longer
+        series are downsampled to at most that many points, the union of the points
+        largest-triangle-three-buckets keeps per dataset, `data.labelIndices` then lists the positions of the
+        remaining points in the labels
+        """
         self._transformer = transformer
+        self._shared_labels = shared_labels
+        self._max_points = max_points
 
     def generate(self, chart_label: str, repository: AbstractRepository, events: List[Event]) -> Dict:
         datasets = [
@@ -20,7 +32,56 @@ class ChartJsJsonGenerator:
             )
             for provider in repository.providers()
         ]
-        return self._generate_config(chart_label, repository.get_dates(), datasets, events)
+        config = self._generate_config(
+            chart_label, repository.get_dates(), datasets, events, repository.get_date_positions()
+        )
+        if self._max_points and len(config["data"]["labels"]) > self._max_points:
+            self._downsample(config)
+        if self._shared_labels:
+            del config["data"]["labels"]
+        return config
+
+    @staticmethod
+    def labels(repository: AbstractRepository) -> Dict:
+        """
+        the dates of all charts as days since the first one
+        """
+        dates = repository.get_dates()
+        if not dates:
+            return {"epoch": None, "offsets": []}
+        epoch = to_ordinal(dates[0])
+        return {"epoch": dates[0], "offsets": [to_ordinal(date) - epoch for date in dates]}
+
+    def _downsample(self, config: Dict):
+        data = config["data"]
+        indices = self._indices([dataset["data"] for dataset in data["datasets"]], len(data["labels"]))
+        for dataset in data["datasets"]:
+            dataset["data"] = [dataset["data"][idx] for idx in indices]
+        data["labels"] = [data["labels"][idx] for idx in indices]
+        data["labelIndices"] = indices
+        # events move to the next remaining point, the last one is always kept
+        for line in config["lineAtIndex"]:
+            line["index"] = bisect.bisect_left(indices, line["index"])
+
+    def _indices(self, series: List[List[Optional[int]]], length: int) -> List[int]:
+        """
+        datasets keep different points, so the largest number of points per dataset whose union still fits
+        into `max_points` is searched for
+        """
+        ret = list(range(length))
+        low, high = 3, self._max_points
+        while low <= high:
+            threshold = (low + high) // 2
+            indices = sorted(
+                {idx for values in series for idx in largest_triangle_three_buckets(values, threshold)}
+            )
+            if len(indices) <= self._max_points:
+                ret = indices
+                low = threshold + 1
+            else:
+                high = threshold - 1
+
+        return ret
 
     @staticmethod
     def _generate_dataset(label: str, color: str, data: List[Optional[int]]):
@@ -35,7 +96,11 @@ class ChartJsJsonGenerator:
 
     @staticmethod
     def _generate_config(
-        chart_label: str, labels: List[str], datasets: List[Dict], events: List[Event]
+        chart_label: str,
+        labels: List[str],
+        datasets: List[Dict],
+        events: List[Event],
+        positions: Optional[Dict[str, int]] = None,
     ) -> Dict:
         return {
             "type": "line",
@@ -43,7 +108,7 @@ class ChartJsJsonGenerator:
                 "labels": labels,
                 "datasets": datasets,
             },
-            "lineAtIndex": list(ChartJsJsonGenerator._event_indices(labels, events)),
+            "lineAtIndex": list(ChartJsJsonGenerator._event_indices(labels, events, positions)),
             "options": {
                 "responsive": True,
                 "plugins": {
@@ -56,8 +121,17 @@ class ChartJsJsonGenerator:
         }
 
     @staticmethod
-    def _event_indices(labels: List[str], events: List[Event]) -> Iterable[Dict]:
-        for idx, date in enumerate(labels):
-            for event in events:
-                if event.date == date:
-                    yield {"index": idx, "caption": event.name}
+    def _event_indices(
+        labels: List[str], events: List[Event], positions: Optional[Dict[str, int]] = None
+    ) -> Iterable[Dict]:
+        """
+        `positions` maps every label to its index, events on dates without a label are left out
+        """
+        if positions is None:
+            positions = {date: idx for idx, date in enumerate(labels)}
+        # stable, so events of the same day keep their order
+        for idx, event in sorted(
+            ((positions[event.date], event) for event in events if event.date in positions),
+            key=lambda item: item[0],
+        ):
+            yield {"index": idx, "caption": event.name}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import bisect
+import datetime
+import logging
+from typing import Optional
+
+from lib.model import Provider, DateRange
+from lib.responses import ResponseManager
+from lib.series import to_ordinal
+from normalizer.transformer import Transformer
+
+
+class ScrapeWindowPlanner:
+    """
+    decides which dates a scraper requests: a window from `overlap_days` before the last date stored for any
+    metric of the provider up to today, or the full history (None) on the first run and whenever the stored
+    history has a gap
+
+    Only responses stored within the last `lookback_days` are normalized for that, so the lookup stays cheap
+    no matter how long the history is. Overlapping windows fold into the same per-date maximum as the "All
+    time" responses, the normalizers need no extra handling for them.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        transformer: Transformer,
+        response_manager: ResponseManager,
+        overlap_days: int = 7,
+        lookback_days: int = 90,
+    ):
+        self._logger = logger
+        self._transformer = transformer
+        self._response_manager = response_manager
+        self._overlap_days = overlap_days
+        self._lookback_days = lookback_days
+
+    def plan(
+        self,
+        scraper_name: str,
+        provider: Provider,
+        today: Optional[datetime.date] = None,
+        show: Optional[str] = None,
+    ) -> Optional[DateRange]:
+        """
+        with a `show`, only responses tagged with it are taken into account
+        """
+        today = today or datetime.date.today()
+        since = datetime.datetime.combine(
+            today - datetime.timedelta(days=self._lookback_days), datetime.time(), datetime.timezone.utc
+        )
+        responses = self._response_manager.find(scraper_name=scraper_name, since=since, show=show)
+        by_date = self._transformer.fold(responses).get(provider, {})
+        lookback_start = today.toordinal() - self._lookback_days
+        label = scraper_name if show is None else f"{scraper_name}@{show}"
+
+        last_dates = []
+        for metric in self._transformer.strategy(provider).metrics():
+            ordinals = sorted(
+                to_ordinal(date) for date, point in by_date.items() if getattr(point, metric) is not None
+            )
+            if not ordinals or ordinals[-1] < lookback_start:
+                self._logger.info(f"No recent {metric} of {label} stored, scraping the full history.")
+                return None
+            # dates are unique, so the recent ones are contiguous if there are as many as days they span
+            first = max(ordinals[0], lookback_start)
+            recent = len(ordinals) - bisect.bisect_left(ordinals, first)
+            if recent != ordinals[-1] - first + 1:
+                self._logger.info(f"Stored {metric} of {label} has a gap, scraping the full history.")
+                return None
+            last_dates.append(ordinals[-1])
+
+        date_range = DateRange(datetime.date.fromordinal(min(last_dates) - self._overlap_days), today)
+        self._logger.info(f"Scraping {date_range} ({date_range.days} days) for {label}.")
+
+        return date_range
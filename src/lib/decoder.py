@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import dataclasses
+import json
+import typing
+from typing import Any, Optional, Type, TypeVar, Dict, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+T = TypeVar("T")
+
+BACKENDS = ["msgspec", "orjson", "json"]
+
+
+class Decoder:
+    """
+    decodes JSON with the fastest installed library, `decode_as` decodes into a schema, i.e. a dataclass with
+    a static `from_dict` method which only covers the fields we consume
+
+    msgspec decodes straight into `msgspec.Struct` mirrors of the schema (which are a lot faster to construct
+    than dataclasses) and skips all other fields, the other backends decode into dicts first and use
+    `from_dict`.
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        if backend is None:
+            backend = next(b for b in BACKENDS if self.available(b))
+        if not self.available(backend):
+            raise ValueError(f"JSON backend {repr(backend)} is not installed.")
+        self._backend = backend
+        self._typed_decoders: Dict[Type, Any] = {}
+        if backend == "msgspec":
+            self._decode = msgspec.json.Decoder().decode
+        elif backend == "orjson":
+            self._decode = orjson.loads
+        else:
+            self._decode = json.loads
+
+    @staticmethod
+    def available(backend: str) -> bool:
+        if backend == "msgspec":
+            return msgspec is not None
+        if backend == "orjson":
+            return orjson is not None
+        return backend == "json"
+
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    def decode(self, data: bytes) -> Any:
+        return self._decode(data)
+
+    def decode_as(self, data: bytes, schema: Type[T]) -> T:
+        if self._backend != "msgspec":
+            return schema.from_dict(self._decode(data))
+        decoder = self._typed_decoders.get(schema)
+        if decoder is None:
+            decoder = self._typed_decoders[schema] = msgspec.json.Decoder(self._struct(schema))
+        return decoder.decode(data)
+
+    @classmethod
+    def _struct(cls, tp: Any) -> Any:
+        origin = typing.get_origin(tp)
+        if origin is Union:
+            return Union[tuple(cls._struct(arg) for arg in typing.get_args(tp))]
+        if origin is not None:
+            return origin[tuple(cls._struct(arg) for arg in typing.get_args(tp))]
+        if not dataclasses.is_dataclass(tp):
+            return tp
+
+        hints = typing.get_type_hints(tp)
+        return msgspec.defstruct(
+            tp.__name__,
+            [
+                (
+                    (f.name, cls._struct(hints[f.name]))
+                    if f.default is dataclasses.MISSING
+                    else (f.name, cls._struct(hints[f.name]), f.default)
+                )
+                for f in dataclasses.fields(tp)
+            ],
+        )
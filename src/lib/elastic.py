@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import collections
+import concurrent.futures
+import json
+import logging
+from typing import Dict, Iterable, Optional, BinaryIO, Deque
+
+import urllib3
+
+from lib.factory import KeyFactory
+from lib.model import Provider, DataPoint
+
+
+class BulkEncoder:
+    """
+    turns data points into batches of `_bulk` NDJSON, an `index` action with the ID of `KeyFactory.for_state`
+    followed by the document, at most `batch_size` documents per batch
+    """
+
+    def __init__(self, index: Optional[str] = None, batch_size: int = 500, show: Optional[str] = None):
+        """
+        without an `index`, the action lines leave it to the URL the batches are sent to
+        """
+        self._index = index
+        self._batch_size = max(1, batch_size)
+        self._show = show
+
+    def batches(self, by_date: Dict[str, Dict[Provider, DataPoint]]) -> Iterable[bytes]:
+        lines = []
+        count = 0
+        for date in sorted(by_date.keys()):
+            for provider, point in by_date[date].items():
+                action = {"_id": KeyFactory.for_state(provider, date, self._show)}
+                if self._index is not None:
+                    action["_index"] = self._index
+                document = point.dict
+                document["date"] = date
+                if self._show is not None:
+                    document["show"] = self._show
+                lines.append(json.dumps({"index": action}, separators=(",", ":")))
+                lines.append(json.dumps(document, separators=(",", ":"), sort_keys=True))
+                count += 1
+                if count == self._batch_size:
+                    yield self._join(lines)
+                    lines, count = [], 0
+        if lines:
+            yield self._join(lines)
+
+    @staticmethod
+    def _join(lines) -> bytes:
+        # the bulk API requires a newline after the last line as well
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class BulkWriter:
+    """
+    writes batches to a stream, e.g. stdout for `curl --data-binary @- .../_bulk`
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+
+    def send(self, batches: Iterable[bytes]) -> int:
+        count = 0
+        for batch in batches:
+            self._stream.write(batch)
+            count += 1
+        self._stream.flush()
+        return count
+
+
+class BulkSender:
+    """
+    posts batches to the `_bulk` endpoint at `url` over a pool of keep-alive connections
+
+    At most `max_in_flight` batches are being sent at once, encoding waits for the oldest one beyond that, so
+    memory stays bounded no matter how fast batches are produced. Connection errors and 429/5xx responses are
+    retried with exponential backoff, honouring `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        url: str,
+        api_key: Optional[str] = None,
+        max_in_flight: int = 2,
+        timeout: float = 60,
+        retries: int = 5,
+    ):
+        self._logger = logger
+        self._url = url
+        self._headers = {"Content-Type": "application/x-ndjson"}
+        if api_key:
+            self._headers["Authorization"] = f"ApiKey {api_key}"
+        self._max_in_flight = max(1, max_in_flight)
+        self._pool = urllib3.PoolManager(
+            maxsize=self._max_in_flight,
+            timeout=urllib3.Timeout(connect=10, read=timeout),
+            retries=urllib3.Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=None,
+            ),
+        )
+
+    def send(self, batches: Iterable[bytes]) -> int:
+        """
+        returns the number of sent batches, raises if a batch couldn't be sent or any document was rejected
+        """
+        count = failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_in_flight) as executor:
+            in_flight: Deque[concurrent.futures.Future] = collections.deque()
+            try:
+                for batch in batches:
+                    if len(in_flight) >= self._max_in_flight:
+                        failed += in_flight.popleft().result()
+                    in_flight.append(executor.submit(self._post, batch))
+                    count += 1
+                while in_flight:
+                    failed += in_flight.popleft().result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
+        self._logger.info(f"Sent {count} batch(es) to {self._url}.")
+        if failed:
+            raise ValueError(f"{failed} document(s) were rejected by {self._url}.")
+
+        return count
+
+    def _post(self, batch: bytes) -> int:
+        response = self._pool.request("POST", self._url, body=batch, headers=self._headers)
+        if response.status != 200:
+            raise ValueError(f"Bulk request to {self._url} failed with status {response.status}.")
+        result = json.loads(response.data)
+        if not result.get("errors"):
+            return 0
+        failed = [item for item in result["items"] for action in item.values() if action.get("error")]
+        for item in failed[:5]:
+            self._logger.warning(f"Rejected document: {item}")
+
+        return len(failed)
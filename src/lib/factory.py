@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import datetime
+import json
 import logging
-from typing import List, Iterable
+import os
+import re
+from typing import List, Iterable, Dict, Union, Optional
 
-from lib.model import Provider
+from lib.model import Provider, ShowConfig, SpotifyConfig, AmazonConfig
 
 
 class LoggerFactory:
     @staticmethod
     def get(debug: bool) -> logging.Logger:
         logger = logging.getLogger()
-        logger.addHandler(logging.StreamHandler())
+        # forked scraper workers inherit the handler of the parent
+        if not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
         logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
         return logger
@@ -25,5 +30,58 @@ class DateFactory:
 
 class KeyFactory:
     @staticmethod
-    def for_state(provider: Provider, date: str):
-        return f"{provider.value}-{date}"
+    def for_state(provider: Provider, date: str, show: Optional[str] = None):
+        return f"{provider.value}-{date}" if show is None else f"{show}-{provider.value}-{date}"
+
+
+class ScraperConfigFactory:
+    """
+    reads accounts and their shows from a JSON file like
+
+        {"accounts": [{"provider": "Spotify", "account": "network", "user_name": "...",
+                       "password_env": "...", "shows": [{"id": "...", "tag": "my-show"}, ...]}, ...]}
+
+    `password_env` names an environment variable holding the password, `password` works as well. Give shows
+    the same `tag` at every provider, it defaults to the ID. Several accounts of one provider need distinct
+    `account` names.
+    """
+
+    CONFIG_CLASSES = {"Spotify": SpotifyConfig, "Amazon": AmazonConfig}
+    TAG = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+    @classmethod
+    def from_file(cls, file_name: str) -> List[Union[SpotifyConfig, AmazonConfig]]:
+        with open(file_name, "r") as fp:
+            return cls.from_dict(json.load(fp))
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> List[Union[SpotifyConfig, AmazonConfig]]:
+        ret = []
+        for account in d["accounts"]:
+            if account["provider"] not in cls.CONFIG_CLASSES:
+                raise ValueError(f"Unknown provider {repr(account['provider'])}.")
+            password = account.get("password")
+            if "password_env" in account:
+                password = os.getenv(account["password_env"])
+                if password is None:
+                    raise ValueError(f"Environment variable {account['password_env']} is not set.")
+            shows = [
+                ShowConfig(show["id"], show.get("tag", show["id"])) for show in account.get("shows", [])
+            ]
+            for show in shows:
+                if not cls.TAG.match(show.tag):
+                    raise ValueError(f"Show tag {repr(show.tag)} may only contain letters, digits and _.-")
+            ret.append(
+                cls.CONFIG_CLASSES[account["provider"]](
+                    user_name=account["user_name"],
+                    password=password,
+                    account=account.get("account"),
+                    shows=shows,
+                )
+            )
+
+        accounts = [(config.__class__, config.account) for config in ret]
+        if len(set(accounts)) != len(accounts):
+            raise ValueError("Accounts of the same provider need distinct account names.")
+
+        return ret
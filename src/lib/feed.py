@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import email.utils
+import io
+import logging
+import os.path
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import List, Optional, BinaryIO
+
+import urllib3
+
+from lib.model import Event
+from lib.payload_store import write_files_atomically
+
+
+class FeedEventsRepository:
+    """
+    an event per episode of a podcast RSS feed, dated by the day of its `pubDate` as written in the feed
+
+    `source` is a file name or an http(s) URL. Downloads are kept in `cache_file_name` and only requested
+    again after `max_age` seconds, with `If-Modified-Since`. If the download fails, the cached feed is used.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        source: str,
+        cache_file_name: Optional[str] = None,
+        max_age: float = 3600,
+        timeout: float = 30,
+    ):
+        self._logger = logger
+        self._source = source
+        self._cache_file_name = cache_file_name
+        self._max_age = max_age
+        self._timeout = timeout
+
+    def all(self) -> List[Event]:
+        events = None
+        if self._source.startswith(("http://", "https://")):
+            data = self._download()
+            if data is not None:
+                events = self._parse(io.BytesIO(data), self._source)
+                # a download which isn't a feed, e.g. an error page, never replaces the cached one
+                if events is not None and self._cache_file_name is not None:
+                    write_files_atomically([(self._cache_file_name, data)], overwrite=True)
+                    self._logger.info(f"Wrote {self._cache_file_name}.")
+            if events is None:
+                events = self._read(self._cache_file_name)
+        else:
+            events = self._read(self._source)
+        if events is None:
+            self._logger.warning(f"Feed {self._source} not available, no episode events.")
+            return []
+        self._logger.info(f"Read {len(events)} episode(s) from {self._source}.")
+
+        return events
+
+    def _read(self, file_name: Optional[str]) -> Optional[List[Event]]:
+        if file_name is None or not os.path.exists(file_name):
+            return None
+        with open(file_name, "rb") as fp:
+            return self._parse(fp, file_name)
+
+    def _download(self) -> Optional[bytes]:
+        """
+        returns the feed if a new one was downloaded, otherwise the cached one is up to date or has to do
+        """
+        cached = self._cache_file_name is not None and os.path.exists(self._cache_file_name)
+        if cached and time.time() - os.path.getmtime(self._cache_file_name) < self._max_age:
+            return None
+
+        headers = {}
+        if cached:
+            headers["If-Modified-Since"] = email.utils.formatdate(
+                os.path.getmtime(self._cache_file_name), usegmt=True
+            )
+        try:
+            response = urllib3.PoolManager().request(
+                "GET", self._source, headers=headers, timeout=self._timeout, retries=urllib3.Retry(3)
+            )
+        except urllib3.exceptions.HTTPError as e:
+            self._logger.warning(f"Downloading {self._source} failed: {e}")
+            return None
+        if response.status == 304:
+            os.utime(self._cache_file_name)
+            return None
+        if response.status != 200:
+            self._logger.warning(f"Downloading {self._source} failed with status {response.status}.")
+            return None
+
+        return response.data
+
+    def _parse(self, fp: BinaryIO, name: str) -> Optional[List[Event]]:
+        """
+        streams over the items, so feeds with thousands of episodes don't have to fit into memory as a tree,
+        returns None if `fp` isn't well-formed XML
+        """
+        try:
+            return self._parse_items(fp)
+        except ElementTree.ParseError as e:
+            self._logger.warning(f"Unparsable feed {name}: {e}")
+            return None
+
+    def _parse_items(self, fp: BinaryIO) -> List[Event]:
+        ret = []
+        for _, element in ElementTree.iterparse(fp):
+            if element.tag != "item":
+                continue
+            title = element.findtext("title")
+            published = element.findtext("pubDate")
+            element.clear()
+            if not title or not published:
+                continue
+            try:
+                date = email.utils.parsedate_to_datetime(published.strip()).date()
+            except (TypeError, ValueError):
+                self._logger.warning(f"Unparsable pubDate {repr(published)} of {repr(title)}, skipping.")
+                continue
+            ret.append(Event(date=date.isoformat(), name=title.strip()))
+
+        return ret
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import concurrent.futures
+import json
+import logging
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import List, Dict, Iterable, Optional
+
+import urllib3
+
+from lib.model import Response
+
+# set by the browser or by urllib3 itself
+SKIPPED_HEADERS = {"host", "cookie", "content-length", "connection", "accept-encoding"}
+
+
+@dataclass
+class HttpSession:
+    """
+    cookies (as returned by CDP `Network.getAllCookies`) and request headers of a logged-in browser
+    """
+
+    cookies: List[Dict] = field(default_factory=list)
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def cookie_header(self, url: str) -> Optional[str]:
+        parsed = urllib.parse.urlsplit(url)
+        host = parsed.hostname or ""
+        path = parsed.path or "/"
+        pairs = []
+        for cookie in self.cookies:
+            domain = cookie["domain"].lstrip(".")
+            if host != domain and not host.endswith(f".{domain}"):
+                continue
+            if not path.startswith(cookie.get("path", "/")):
+                continue
+            if cookie.get("secure") and parsed.scheme != "https":
+                continue
+            pairs.append(f"{cookie['name']}={cookie['value']}")
+        return "; ".join(pairs) if pairs else None
+
+    def headers_for(self, url: str) -> Dict[str, str]:
+        ret = {
+            name: value
+            for name, value in self.headers.items()
+            if not name.startswith(":") and name.lower() not in SKIPPED_HEADERS
+        }
+        cookie_header = self.cookie_header(url)
+        if cookie_header is not None:
+            ret["Cookie"] = cookie_header
+        return ret
+
+
+class DirectFetcher:
+    """
+    fetches JSON endpoints with the session of the browser, concurrently over a pool of keep-alive
+    connections
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        session: HttpSession,
+        workers: int = 4,
+        timeout: float = 30,
+        retries: int = 3,
+    ):
+        self._logger = logger
+        self._session = session
+        self._workers = workers
+        self._pool = urllib3.PoolManager(
+            maxsize=workers,
+            timeout=urllib3.Timeout(connect=10, read=timeout),
+            retries=urllib3.Retry(
+                total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]
+            ),
+        )
+
+    def fetch(self, urls: Iterable[str]) -> Iterable[Response]:
+        """
+        yields a response per URL in the order they complete, failed requests and bodies which aren't JSON
+        are logged and skipped
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = [executor.submit(self._fetch, url) for url in urls]
+            for future in concurrent.futures.as_completed(futures):
+                response = future.result()
+                if response is not None:
+                    yield response
+
+    def _fetch(self, url: str) -> Optional[Response]:
+        try:
+            http_response = self._pool.request("GET", url, headers=self._session.headers_for(url))
+        except urllib3.exceptions.HTTPError as e:
+            self._logger.warning(f"Fetching {url} failed: {e}")
+            return None
+        if http_response.status != 200:
+            self._logger.warning(f"Fetching {url} failed with status {http_response.status}.")
+            return None
+        try:
+            return Response.from_dict(json.loads(http_response.data), url)
+        except ValueError:
+            # JSONDecodeError as well as UnicodeDecodeError of bodies which aren't UTF-8
+            self._logger.warning(f"Response of {url} is not JSON.")
+            return None
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import sqlite3
+from typing import Iterable, Tuple, Optional, List, Set
+
+from lib.model import ResponseMeta
+
+
+class MetaIndex:
+    """
+    SQLite backed index of all stored meta files, allows finding responses without walking the meta directory
+    """
+
+    def __init__(self, file_name: str):
+        self._connection = sqlite3.connect(file_name, timeout=30)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "path TEXT PRIMARY KEY, "
+                "scraper TEXT NOT NULL, "
+                "sha256 TEXT NOT NULL, "
+                "url TEXT, "
+                "timestamp TEXT NOT NULL, "
+                "epoch REAL NOT NULL, "
+                "show TEXT"
+                ")"
+            )
+            # indexes created before responses were tagged with their show
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(meta)")]
+            if "show" not in columns:
+                self._connection.execute("ALTER TABLE meta ADD COLUMN show TEXT")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS meta_epoch ON meta (epoch)")
+
+    @staticmethod
+    def _epoch(ts: datetime.datetime) -> float:
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=datetime.timezone.utc)
+        return ts.timestamp()
+
+    def append(self, path: str, scraper_name: str, meta: ResponseMeta):
+        self.append_many([(path, scraper_name, meta)])
+
+    def append_many(self, rows: Iterable[Tuple[str, str, ResponseMeta]]):
+        with self._connection:
+            self._insert(rows)
+
+    def replace_all(self, rows: Iterable[Tuple[str, str, ResponseMeta]]):
+        with self._connection:
+            self._connection.execute("DELETE FROM meta")
+            self._insert(rows)
+
+    def _insert(self, rows: Iterable[Tuple[str, str, ResponseMeta]]):
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO meta (path, scraper, sha256, url, timestamp, epoch, show) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    path,
+                    scraper_name,
+                    meta.sha256,
+                    meta.url,
+                    meta.timestamp.isoformat(),
+                    self._epoch(meta.timestamp),
+                    meta.show,
+                )
+                for path, scraper_name, meta in rows
+            ),
+        )
+
+    def find(
+        self,
+        scraper_name: Optional[str] = None,
+        url_pattern: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        show: Optional[str] = None,
+    ) -> Iterable[Tuple[str, ResponseMeta]]:
+        """
+        `url_pattern` is a shell-style wildcard pattern (`*`, `?`, `[...]`), `since` is inclusive and `until`
+        is exclusive, `show` only matches responses tagged with exactly that show
+        """
+        conditions: List[str] = []
+        params: List = []
+        if scraper_name is not None:
+            conditions.append("scraper = ?")
+            params.append(scraper_name)
+        if url_pattern is not None:
+            conditions.append("url GLOB ?")
+            params.append(url_pattern)
+        if since is not None:
+            conditions.append("epoch >= ?")
+            params.append(self._epoch(since))
+        if until is not None:
+            conditions.append("epoch < ?")
+            params.append(self._epoch(until))
+        if show is not None:
+            conditions.append("show = ?")
+            params.append(show)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        for path, sha256, url, timestamp, show in self._connection.execute(
+            f"SELECT path, sha256, url, timestamp, show FROM meta{where} ORDER BY epoch, path", params
+        ):
+            yield path, ResponseMeta(
+                sha256=sha256, url=url, timestamp=datetime.datetime.fromisoformat(timestamp), show=show
+            )
+
+    def shows(self) -> Set[str]:
+        return {
+            row[0]
+            for row in self._connection.execute("SELECT DISTINCT show FROM meta WHERE show IS NOT NULL")
+        }
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM meta").fetchone()[0]
@@ -4,8 +4,8 @@ import datetime
 import enum
 import hashlib
 import json
-from dataclasses import dataclass
-from typing import Optional, Dict, Union, DefaultDict
+from dataclasses import dataclass, fields, field
+from typing import Optional, Dict, Union, DefaultDict, List, Iterable
 
 
 @dataclass
@@ -13,6 +13,8 @@ class ResponseMeta:
     sha256: str
     timestamp: datetime.datetime = datetime.datetime.now(datetime.timezone.utc)
     url: Optional[str] = None
+    # tag of the show the response belongs to, None for responses of single-show setups
+    show: Optional[str] = None
 
 
 @dataclass
@@ -30,11 +32,46 @@ class Response:
         )
 
 
+@dataclass
+class DateRange:
+    """
+    inclusive on both ends
+    """
+
+    start: datetime.date
+    end: datetime.date
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def __str__(self):
+        return f"{self.start.isoformat()}..{self.end.isoformat()}"
+
+
+@dataclass
+class ShowConfig:
+    """
+    `show_id` is the ID of the show at the provider, `tag` is stored with its responses and should be the
+    same at all providers of a show
+    """
+
+    show_id: Optional[str]
+    tag: Optional[str] = None
+
+
 @dataclass
 class SpotifyConfig:
     user_name: str
     password: str
-    podcast_id: str
+    podcast_id: Optional[str] = None
+    # distinguishes several accounts of the same provider
+    account: Optional[str] = None
+    shows: List[ShowConfig] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.shows:
+            self.shows = [ShowConfig(self.podcast_id)]
 
 
 @dataclass
@@ -49,6 +86,14 @@ class AppleConfig:
 class AmazonConfig:
     user_name: str
     password: str
+    # None scrapes the show the dashboard opens with
+    podcast_id: Optional[str] = None
+    account: Optional[str] = None
+    shows: List[ShowConfig] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.shows:
+            self.shows = [ShowConfig(self.podcast_id)]
 
 
 class Provider(enum.Enum):
@@ -57,6 +102,14 @@ class Provider(enum.Enum):
     AMAZON = "Amazon"
 
 
+def sorted_providers(providers: Iterable[Provider]) -> List[Provider]:
+    """
+    in the order `Provider` declares them, so outputs don't depend on the order data was read in
+    """
+    order = {provider: idx for idx, provider in enumerate(Provider)}
+    return sorted(set(providers), key=lambda provider: (order.get(provider, len(order)), str(provider)))
+
+
 PROVIDER_COLORS = {
     Provider.SPOTIFY: "rgb(30 215 96)",
     Provider.APPLE: "rgb(125, 125, 125",
@@ -113,6 +166,8 @@ class DataPoint:
         )
 
 
+DATA_POINT_METRICS = [f.name for f in fields(DataPoint) if f.name != "provider"]
+
 DataPointStrDict = Union[DefaultDict[str, DataPoint], Dict[str, DataPoint]]
 
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import json
+import logging
+import os.path
+from typing import Dict, Any, List, Tuple, Optional
+
+from lib.payload_store import write_files_atomically
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class JsonOutputWriter:
+    """
+    writes JSON files into `directory`, pretty-printed or with `minify` without any whitespace
+
+    With `precompress`, every file gets `.gz` and (if `brotli` is installed) `.br` siblings a static web
+    server can serve as they are, e.g. nginx with `gzip_static` and `brotli_static`. All files of a call are
+    replaced atomically in one batch.
+
+    The SHA-256 of every file is kept in `MANIFEST_FILE_NAME` together with an ETag, and files whose content
+    didn't change since the previous run aren't touched, so their modification time (and the ETag web servers
+    derive from it) stays the same. With `versioned`, every file is also written as e.g.
+    `follower_count.<hash>.json` and the manifest lists that name for cache-busting. The version it replaces
+    is kept (as `previous`) until the next run, so clients holding the old manifest can still load it.
+    Compressed siblings which don't match the current settings are removed.
+    """
+
+    MANIFEST_FILE_NAME = "manifest.json"
+    COMPRESSED_EXTENSIONS = [".gz", ".br"]
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        directory: str,
+        minify: bool = False,
+        precompress: bool = False,
+        versioned: bool = False,
+    ):
+        self._logger = logger
+        self._directory = directory
+        self._minify = minify
+        self._precompress = precompress
+        self._versioned = versioned
+        if precompress and brotli is None:
+            self._logger.warning("brotli is not installed, writing .gz files only.")
+
+    def write(self, file_name: str, obj: Any) -> int:
+        return self.write_many({file_name: obj})
+
+    def write_many(self, objs: Dict[str, Any]) -> int:
+        """
+        returns the number of files which changed and were written
+        """
+        manifest_path = os.path.join(self._directory, self.MANIFEST_FILE_NAME)
+        manifest = self._load_manifest(manifest_path)
+        files = []
+        written = []
+        stale = []
+        changed = not os.path.exists(manifest_path)
+        for file_name, obj in objs.items():
+            data = self._serialize(obj)
+            entry = self._entry(file_name, data)
+            paths = [file_name] if entry["versioned"] is None else [file_name, entry["versioned"]]
+            previous = manifest.get(file_name, {})
+            unchanged = all(previous.get(key) == value for key, value in entry.items())
+            if unchanged and all(os.path.exists(p) for name in paths for p in self._paths(name)):
+                # the version before has been kept for a run already
+                entry["previous"] = None
+            else:
+                for name in paths:
+                    files.extend(self._files(os.path.join(self._directory, name), data))
+                written.append(file_name)
+                # a restored file keeps what it kept before, a changed one the version it replaces
+                entry["previous"] = previous.get("previous") if unchanged else previous.get("versioned")
+                if entry["previous"] == entry["versioned"]:
+                    entry["previous"] = None
+            if previous.get("previous") not in [None, entry["versioned"], entry["previous"]]:
+                stale.extend(self._all_paths(previous["previous"]))
+            # e.g. without `precompress` now
+            for name in paths:
+                stale.extend(set(self._all_paths(name)) - set(self._paths(name)))
+            changed = changed or entry != previous
+            manifest[file_name] = entry
+
+        if changed:
+            files.append((manifest_path, json.dumps(manifest, indent=4, sort_keys=True).encode("utf-8")))
+            write_files_atomically(files, overwrite=True)
+        for file_name in written:
+            self._logger.info(f"Wrote {os.path.join(self._directory, file_name)}.")
+        if len(written) < len(objs):
+            self._logger.info(f"Skipped {len(objs) - len(written)} unchanged file(s).")
+        # only once the manifest doesn't refer to them anymore
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        return len(written)
+
+    def _load_manifest(self, manifest_path: str) -> Dict[str, Dict]:
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, "rb") as fp:
+                return json.load(fp)
+        except json.JSONDecodeError:
+            self._logger.warning(f"Ignoring unreadable {manifest_path}, rewriting all files.")
+            return {}
+
+    def _entry(self, file_name: str, data: bytes) -> Dict[str, Optional[str]]:
+        digest = hashlib.sha256(data).hexdigest()
+        versioned = None
+        if self._versioned:
+            root, extension = os.path.splitext(file_name)
+            versioned = f"{root}.{digest[:12]}{extension}"
+        return {"sha256": digest, "etag": f'"{digest[:16]}"', "bytes": len(data), "versioned": versioned}
+
+    def _serialize(self, obj: Any) -> bytes:
+        if self._minify:
+            return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        return json.dumps(obj, indent=4).encode("utf-8")
+
+    def _paths(self, file_name: str) -> List[str]:
+        path = os.path.join(self._directory, file_name)
+        ret = [path]
+        if self._precompress:
+            ret.append(f"{path}.gz")
+            if brotli is not None:
+                ret.append(f"{path}.br")
+        return ret
+
+    def _all_paths(self, file_name: str) -> List[str]:
+        path = os.path.join(self._directory, file_name)
+        return [path] + [f"{path}{extension}" for extension in self.COMPRESSED_EXTENSIONS]
+
+    def _files(self, path: str, data: bytes) -> List[Tuple[str, bytes]]:
+        ret = [(path, data)]
+        if self._precompress:
+            # without a timestamp, unchanged content compresses to unchanged files
+            ret.append((f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0)))
+            if brotli is not None:
+                ret.append((f"{path}.br", brotli.compress(data)))
+        return ret
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import abc
+import gzip
+import mmap
+import os.path
+import pathlib
+import re
+import sqlite3
+import struct
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Optional, Iterable, Tuple, Dict, Container, List, BinaryIO, DefaultDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = ["none", "gzip", "zstd"]
+
+
+def _file_mode() -> int:
+    # the mode `open` creates files with, `mkstemp` always uses 0600
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+FILE_MODE = _file_mode()
+
+
+def write_files_atomically(files: Iterable[Tuple[str, bytes]], overwrite: bool = False) -> int:
+    """
+    writes every file to a temporary file next to it and renames it into place once all of them have been
+    synced, returns the number of written files
+
+    Directories are created and listed once per batch, files which already exist are skipped unless
+    `overwrite` is set. Readers never see partial files and concurrent writers never share a temporary file,
+    so several processes can write to the same directories, the last rename of a path wins. Files get the
+    permissions `open` would give them. Every file is synced before the renames and every directory once
+    after them, so the renames survive a crash as well.
+    """
+    by_directory: DefaultDict[str, Dict[str, bytes]] = defaultdict(dict)
+    for path, data in files:
+        by_directory[os.path.dirname(path)][os.path.basename(path)] = data
+
+    renames = []
+    try:
+        for directory, by_name in by_directory.items():
+            pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+            existing = set() if overwrite else set(os.listdir(directory))
+            for name, data in by_name.items():
+                if name in existing:
+                    continue
+                fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+                renames.append((tmp_path, os.path.join(directory, name)))
+                if hasattr(os, "fchmod"):
+                    os.fchmod(fd, FILE_MODE)
+                with os.fdopen(fd, "wb") as fp:
+                    fp.write(data)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+        for tmp_path, path in renames:
+            os.replace(tmp_path, path)
+        for directory in {os.path.dirname(path) for _, path in renames}:
+            _sync_directory(directory)
+    except BaseException:
+        for tmp_path, _ in renames:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    return len(renames)
+
+
+def _sync_directory(directory: str):
+    # directories can't be opened on Windows, where renames don't need it
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class PayloadStore(abc.ABC):
+    @abc.abstractmethod
+    def exists(self, sha256: str) -> bool:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def read(self, sha256: str) -> bytes:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def write(self, sha256: str, data: bytes):
+        raise NotImplementedError()
+
+    def write_many(self, items: Iterable[Tuple[str, bytes]]) -> int:
+        """
+        stores all payloads which aren't stored yet, returns the number of written payloads
+        """
+        count = 0
+        for sha256, data in items:
+            if not self.exists(sha256):
+                self.write(sha256, data)
+                count += 1
+
+        return count
+
+
+class FilePayloadStore(PayloadStore):
+    """
+    one file per payload, placed in three levels of subdirectories named after the first bytes of the hash
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self._directory, sha256[0:2], sha256[2:4], sha256[4:6], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def read(self, sha256: str) -> bytes:
+        with open(self.path(sha256), "rb") as fp:
+            return fp.read()
+
+    def write(self, sha256: str, data: bytes):
+        self.write_many([(sha256, data)])
+
+    def write_many(self, items: Iterable[Tuple[str, bytes]]) -> int:
+        return write_files_atomically((self.path(sha256), data) for sha256, data in items)
+
+    def walk(self) -> Iterable[str]:
+        for root, dir_names, file_names in os.walk(self._directory):
+            if root == self._directory and SegmentPayloadStore.SEGMENT_DIR in dir_names:
+                dir_names.remove(SegmentPayloadStore.SEGMENT_DIR)
+            for file_name in file_names:
+                if re.fullmatch(r"[0-9a-f]{64}", file_name):
+                    yield file_name
+
+    def delete(self, sha256: str):
+        path = self.path(sha256)
+        os.remove(path)
+        for _ in range(3):
+            path = os.path.dirname(path)
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+
+
+class SegmentPayloadStore(PayloadStore):
+    """
+    appends payloads to large segment files, an SQLite index maps each sha256 to segment, offset and length
+
+    Every record is prefixed with a header (raw sha256, compression id, length) so segments stay
+    self-describing. Payloads which aren't in the index yet are read from the file layout, so a partially
+    migrated payload directory keeps working.
+    """
+
+    SEGMENT_DIR = "segments"
+    INDEX_FILE_NAME = "index.sqlite"
+    HEADER = struct.Struct(">32sBQ")
+
+    def __init__(self, directory: str, compression: str = "none", max_segment_size: int = 256 * 1024 * 1024):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {repr(compression)}.")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("Compression 'zstd' requires the zstandard package.")
+        self._segment_dir = os.path.join(directory, self.SEGMENT_DIR)
+        pathlib.Path(self._segment_dir).mkdir(parents=True, exist_ok=True)
+        self._compression = COMPRESSIONS.index(compression)
+        self._max_segment_size = max_segment_size
+        self._files = FilePayloadStore(directory)
+        self._lock = threading.RLock()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._connection = sqlite3.connect(
+            os.path.join(self._segment_dir, self.INDEX_FILE_NAME),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS payload ("
+            "sha256 TEXT PRIMARY KEY, "
+            "segment INTEGER NOT NULL, "
+            "offset INTEGER NOT NULL, "
+            "length INTEGER NOT NULL, "
+            "compression INTEGER NOT NULL"
+            ")"
+        )
+
+    @staticmethod
+    def exists_in(directory: str) -> bool:
+        return os.path.exists(
+            os.path.join(directory, SegmentPayloadStore.SEGMENT_DIR, SegmentPayloadStore.INDEX_FILE_NAME)
+        )
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._segment_dir, f"{segment:06d}.seg")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(file_name[: -len(".seg")])
+            for file_name in os.listdir(self._segment_dir)
+            if re.fullmatch(r"\d{6}\.seg", file_name)
+        )
+
+    def _locate(self, sha256: str) -> Optional[Tuple[int, int, int, int]]:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT segment, offset, length, compression FROM payload WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+
+    def _map(self, segment: int, size: int) -> mmap.mmap:
+        with self._lock:
+            m = self._maps.get(segment)
+            if m is None or len(m) < size:
+                if m is not None:
+                    m.close()
+                with open(self._segment_path(segment), "rb") as fp:
+                    m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = m
+            return m
+
+    def _close_maps(self):
+        with self._lock:
+            for m in self._maps.values():
+                m.close()
+            self._maps.clear()
+
+    @staticmethod
+    def _compress(compression: int, data: bytes) -> bytes:
+        if compression == 1:
+            return gzip.compress(data)
+        if compression == 2:
+            return zstandard.ZstdCompressor().compress(data)
+        return data
+
+    @staticmethod
+    def _decompress(compression: int, data: bytes) -> bytes:
+        if compression == 1:
+            return gzip.decompress(data)
+        if compression == 2:
+            if zstandard is None:
+                raise RuntimeError("Payload is zstd compressed but the zstandard package is not installed.")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def exists(self, sha256: str) -> bool:
+        return self._locate(sha256) is not None or self._files.exists(sha256)
+
+    def read(self, sha256: str) -> bytes:
+        location = self._locate(sha256)
+        if location is None:
+            return self._files.read(sha256)
+        segment, offset, length, compression = location
+        with self._lock:
+            data = self._map(segment, offset + length)[offset : offset + length]
+        return self._decompress(compression, data)
+
+    def write(self, sha256: str, data: bytes):
+        self.write_many([(sha256, data)])
+
+    def write_many(self, items: Iterable[Tuple[str, bytes]]) -> int:
+        """
+        appends all payloads which aren't stored yet, returns the number of appended payloads
+
+        `BEGIN IMMEDIATE` takes the SQLite write lock, which serializes appends of concurrent processes.
+        """
+        seen = set()
+
+        def is_new(sha256: str) -> bool:
+            if sha256 in seen:
+                return False
+            seen.add(sha256)
+            return self._locate(sha256) is None
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._append(
+                    (sha256, self._compression, self._compress(self._compression, data))
+                    for sha256, data in items
+                    if is_new(sha256)
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+        return count
+
+    def _append(self, records: Iterable[Tuple[str, int, bytes]], segment: Optional[int] = None) -> int:
+        """
+        `records` are tuples of sha256, compression id and the payload compressed with it
+        """
+        segments = self._segments()
+        if segment is None:
+            segment = segments[-1] if segments else 1
+        fp: Optional[BinaryIO] = None
+        rows = []
+        try:
+            for sha256, compression, compressed in records:
+                if fp is None or fp.tell() >= self._max_segment_size:
+                    if fp is not None:
+                        self._sync(fp)
+                        segment += 1
+                    fp = open(self._segment_path(segment), "ab")
+                    if fp.tell() >= self._max_segment_size:
+                        fp.close()
+                        segment += 1
+                        fp = open(self._segment_path(segment), "ab")
+                fp.write(self.HEADER.pack(bytes.fromhex(sha256), compression, len(compressed)))
+                rows.append((sha256, segment, fp.tell(), len(compressed), compression))
+                fp.write(compressed)
+        finally:
+            if fp is not None:
+                self._sync(fp)
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO payload (sha256, segment, offset, length, compression) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+        return len(rows)
+
+    @staticmethod
+    def _sync(fp: BinaryIO):
+        fp.flush()
+        os.fsync(fp.fileno())
+        fp.close()
+
+    def migrate(self, batch_size: int = 1000) -> int:
+        """
+        moves all payloads of the file layout into segments, files are only deleted after their batch has
+        been committed
+        """
+        count = 0
+        batch = []
+        for sha256 in list(self._files.walk()):
+            batch.append(sha256)
+            if len(batch) >= batch_size:
+                count += self._migrate_batch(batch)
+                batch = []
+        if batch:
+            count += self._migrate_batch(batch)
+
+        return count
+
+    def _migrate_batch(self, batch: List[str]) -> int:
+        self.write_many((sha256, self._files.read(sha256)) for sha256 in batch)
+        for sha256 in batch:
+            self._files.delete(sha256)
+
+        return len(batch)
+
+    def compact(self, keep: Optional[Container[str]] = None, recompress: bool = False) -> Tuple[int, int]:
+        """
+        rewrites all payloads (or only those in `keep`) into fresh segments, reclaiming space of dropped
+        payloads and of interrupted writes, returns the number of kept and dropped payloads
+
+        Payloads are copied as they are, with `recompress` they are recompressed with the configured
+        compression.
+        """
+
+        def records(rows: List[Tuple[str, int, int, int, int]]) -> Iterable[Tuple[str, int, bytes]]:
+            for sha256, segment, offset, length, compression in rows:
+                if keep is not None and sha256 not in keep:
+                    continue
+                data = self._map(segment, offset + length)[offset : offset + length]
+                if recompress and compression != self._compression:
+                    data = self._compress(self._compression, self._decompress(compression, data))
+                    compression = self._compression
+                yield sha256, compression, data
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                old_segments = self._segments()
+                rows = self._connection.execute(
+                    "SELECT sha256, segment, offset, length, compression "
+                    "FROM payload ORDER BY segment, offset"
+                ).fetchall()
+                dropped = [row[0] for row in rows if keep is not None and row[0] not in keep]
+                self._connection.executemany("DELETE FROM payload WHERE sha256 = ?", ((s,) for s in dropped))
+                kept = self._append(records(rows), segment=(old_segments[-1] + 1) if old_segments else 1)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._close_maps()
+            for segment in old_segments:
+                os.remove(self._segment_path(segment))
+
+        return kept, len(dropped)
+
+
+class PayloadStoreFactory:
+    @staticmethod
+    def get(directory: str, layout: str = "files", compression: str = "none") -> PayloadStore:
+        """
+        a payload directory which has been migrated to segments is always opened as such
+        """
+        if layout == "segments" or SegmentPayloadStore.exists_in(directory):
+            return SegmentPayloadStore(directory, compression)
+        return FilePayloadStore(directory)
@@ -1,42 +1,106 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import abc
+import functools
 import json
 import os.path
-from typing import Dict, Optional, List, Iterator
+from typing import Dict, Optional, List, Iterator, Union, Tuple
 
-from lib.model import Provider, DataPointStrDict, DataPoint, Event
+from lib.model import Provider, DataPointStrDict, Event, sorted_providers
+from lib.series import ColumnarStore, Number, forward_fill, from_ordinal
 
 
-class AbstractRepository(abc.ABC):
-    def __init__(self, data: Dict[Provider, DataPointStrDict]):
+class RepositoryIndex:
+    """
+    sorted dates and forward-filled series per provider and metric, built once on first access and shared by
+    all repositories over the same data
+    """
+
+    def __init__(self, data: Union[Dict[Provider, DataPointStrDict], ColumnarStore]):
         self._data = data
+        self._filled: Dict[Tuple[Provider, str], List[Number]] = {}
 
+    @functools.cached_property
     def providers(self) -> List[Provider]:
-        return list(set(self._data.keys()))
-
-    def get_dates(self) -> List[str]:
+        if isinstance(self._data, ColumnarStore):
+            return self._data.providers()
+        return sorted_providers(self._data.keys())
+
+    @functools.cached_property
+    def dates(self) -> List[str]:
+        if isinstance(self._data, ColumnarStore):
+            return self._data.dates
         ret = set()
         for provider, by_date in self._data.items():
             ret.update(by_date.keys())
-        return sorted(list(ret))
+        return sorted(ret)
+
+    @functools.cached_property
+    def positions(self) -> Dict[str, int]:
+        """
+        index of every date in `dates`
+        """
+        return {date: idx for idx, date in enumerate(self.dates)}
+
+    @functools.cached_property
+    def last_dates(self) -> Dict[Provider, str]:
+        if isinstance(self._data, ColumnarStore):
+            return {
+                provider: from_ordinal(self._data.series(provider).days[-1])
+                for provider in self._data.providers()
+                if len(self._data.series(provider)) > 0
+            }
+        return {provider: max(by_date.keys()) for provider, by_date in self._data.items() if by_date}
+
+    def filled(self, provider: Provider, metric: str) -> List[Number]:
+        """
+        value of `metric` per date, dates without a (truthy) value repeat the previous one
+        """
+        key = (provider, metric)
+        if key not in self._filled:
+            self._filled[key] = forward_fill(self._aligned(provider, metric))
+        return self._filled[key]
+
+    def _aligned(self, provider: Provider, metric: str) -> List[Number]:
+        if isinstance(self._data, ColumnarStore):
+            return self._data.aligned(provider, metric)
+        ret = [0] * len(self.dates)
+        for date, data_point in self._data.get(provider, {}).items():
+            value = getattr(data_point, metric)
+            if value:
+                ret[self.positions[date]] = value
+        return ret
+
+
+class AbstractRepository(abc.ABC):
+    """
+    all lookups go through a `RepositoryIndex`, pass the same one to every repository over the same data
+    """
+
+    METRIC: str
+
+    def __init__(
+        self,
+        data: Union[Dict[Provider, DataPointStrDict], ColumnarStore],
+        index: Optional[RepositoryIndex] = None,
+    ):
+        self._index = index if index is not None else RepositoryIndex(data)
+
+    def providers(self) -> List[Provider]:
+        return list(self._index.providers)
+
+    def get_dates(self) -> List[str]:
+        return list(self._index.dates)
+
+    def get_date_positions(self) -> Dict[str, int]:
+        return self._index.positions
 
     def sum_by_provider(self, provider: Provider):
-        dates = self.get_dates()
-        if len(dates) == 0:
-            return 0
-        for date in sorted(dates, reverse=True):
-            try:
-                latest_data_point = self._data[provider][date]
-            except KeyError:
-                continue
-            if self.extract_number(latest_data_point):
-                return self.extract_number(latest_data_point)
-
-        return 0
+        filled = self._index.filled(provider, self.METRIC)
+        return filled[-1] if filled else 0
 
     def last_date_of_provider(self, provider: Provider) -> Optional[str]:
-        return max(self._data[provider].keys())
+        return self._index.last_dates.get(provider)
 
     def sum(self):
         ret = 0
@@ -45,55 +109,37 @@ class AbstractRepository(abc.ABC):
         return ret
 
     def find_by_provider(self, provider: Provider) -> Iterator[Optional[int]]:
-        dates = self.get_dates()
-        prev = 0
-        for date in sorted(dates):
-            try:
-                next_val = self.extract_number(self._data[provider][date])
-                if next_val:
-                    prev = next_val
-            except KeyError:
-                pass
-            yield prev
-
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        raise NotImplementedError
+        return iter(self._index.filled(provider, self.METRIC))
 
 
 class FollowerRepository(AbstractRepository):
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        return dp.follower_count
+    METRIC = "follower_count"
 
 
 class ListenerRepository(AbstractRepository):
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        return dp.listener_count
+    METRIC = "listener_count"
 
 
 class EngagedListenerRepository(AbstractRepository):
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        return dp.engaged_listener_count
+    METRIC = "engaged_listener_count"
 
 
 class ConsumptionRepository(AbstractRepository):
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        return dp.consumption_seconds
+    METRIC = "consumption_seconds"
 
 
 class StreamRepository(AbstractRepository):
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        return dp.stream_count
+    METRIC = "stream_count"
 
 
 class StreamStartRepository(AbstractRepository):
-    def extract_number(self, dp: DataPoint) -> Optional[int]:
-        return dp.stream_start_count
+    METRIC = "stream_start_count"
 
 
 class EventsRepository:
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: Optional[str]):
         self._data = []
-        if os.path.exists(file_name):
+        if file_name and os.path.exists(file_name):
             with open(file_name, "rb") as fp:
                 for line in fp:
                     row = json.loads(line.strip())
@@ -101,3 +147,21 @@ class EventsRepository:
 
     def all(self) -> List[Event]:
         return self._data
+
+
+class MergedEventsRepository:
+    """
+    events of all repositories ordered by date, an event with the same date and name as an earlier one is
+    dropped
+    """
+
+    def __init__(self, *repositories):
+        self._repositories = repositories
+
+    def all(self) -> List[Event]:
+        events = {}
+        for repository in self._repositories:
+            for event in repository.all():
+                events.setdefault((event.date, event.name), event)
+
+        return sorted(events.values(), key=lambda event: event.date)
@@ -1,16 +1,24 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import collections
+import concurrent.futures
 import datetime
+import fnmatch
 import json
 import os.path
-import pathlib
 from collections.abc import Iterable
 from dataclasses import asdict
-from typing import Dict
+from typing import Dict, Tuple, Container, Optional, Callable, TypeVar, Set
 
+from lib.decoder import Decoder
+from lib.meta_index import MetaIndex
 from lib.model import Response, ResponseMeta
+from lib.payload_store import PayloadStore, PayloadStoreFactory, write_files_atomically
 from scraper.spotify import Scraper
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 class CustomEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -21,65 +29,241 @@ class CustomEncoder(json.JSONEncoder):
 
 
 class ResponseManager:
-    def __init__(self, meta_dir: str, payload_directory: str):
+    def __init__(
+        self,
+        meta_dir: str,
+        payload_directory: str,
+        meta_index: Optional[MetaIndex] = None,
+        payload_store: Optional[PayloadStore] = None,
+        workers: int = 1,
+        read_ahead: int = 64,
+        decoder: Optional[Decoder] = None,
+    ):
+        """
+        with more than one worker, meta and payload files are read by a thread pool which stays at most
+        `read_ahead` files ahead of the consumer
+        """
         if not os.path.exists(meta_dir) or not os.path.isdir(meta_dir):
             raise ValueError(f"Meta dir path {repr(meta_dir)} not a directory.")
         if not os.path.exists(payload_directory) or not os.path.isdir(payload_directory):
             raise ValueError(f"Payload dir path {repr(payload_directory)} not a directory.")
         self._meta_dir = meta_dir
         self._payload_directory = payload_directory
+        self._meta_index = meta_index
+        self._payload_store = payload_store or PayloadStoreFactory.get(payload_directory)
+        self._workers = workers
+        self._read_ahead = max(read_ahead, workers)
+        self._decoder = decoder or Decoder()
 
     def _meta_path(self, scraper_name: str, meta: ResponseMeta) -> str:
         ts = meta.timestamp
-        dir_path = os.path.join(self._meta_dir, str(ts.year), f"{ts.month:02d}")
-        self._ensure_dir(dir_path)
-
+        name = scraper_name if meta.show is None else f"{scraper_name}@{meta.show}"
         return os.path.join(
-            dir_path, f"{ts.strftime('%Y%m%d-%H%M%S')}-{scraper_name}-{meta.sha256[:10]}.json"
+            self._meta_dir,
+            str(ts.year),
+            f"{ts.month:02d}",
+            f"{ts.strftime('%Y%m%d-%H%M%S')}-{name}-{meta.sha256[:10]}.json",
+        )
+
+    def store(self, scraper: Scraper, response: Response):
+        self.store_by_name(scraper.name, response)
+
+    def store_by_name(self, scraper_name: str, response: Response):
+        self.store_many([(scraper_name, response)])
+
+    def store_many(self, responses: Iterable[Tuple[str, Response]]) -> int:
+        """
+        stores tuples of scraper name and response, returns the number of newly written meta files
+
+        Payloads and meta files are written atomically in one batch each, see `write_files_atomically`, so
+        several scraper processes can store into the same directories at once.
+        """
+        metas = {}
+        payloads = {}
+        for scraper_name, response in responses:
+            meta_path = self._meta_path(scraper_name, response.meta)
+            metas[meta_path] = (scraper_name, response.meta)
+            payloads[response.meta.sha256] = response.data
+        if not metas:
+            return 0
+
+        self._payload_store.write_many(payloads.items())
+        count = write_files_atomically(
+            (
+                meta_path,
+                json.dumps(asdict(meta), sort_keys=True, cls=CustomEncoder).encode("utf-8"),
+            )
+            for meta_path, (_, meta) in metas.items()
         )
+        if self._meta_index is not None:
+            self._meta_index.append_many(
+                (self._relative_meta_path(meta_path), scraper_name, meta)
+                for meta_path, (scraper_name, meta) in metas.items()
+            )
 
-    def _payload_path(self, sha256: str) -> str:
-        dir_path = os.path.join(self._payload_directory, sha256[0:2], sha256[2:4], sha256[4:6])
-        self._ensure_dir(dir_path)
+        return count
 
-        return os.path.join(dir_path, sha256)
+    def _relative_meta_path(self, meta_path: str) -> str:
+        return os.path.relpath(meta_path, self._meta_dir).replace(os.sep, "/")
 
     @staticmethod
-    def _ensure_dir(d: str):
-        if os.path.exists(d):
-            if os.path.isdir(d):
-                pass
-            else:
-                raise RuntimeError(f"Path {d:r} exists but is not a directory.")
-        else:
-            pathlib.Path(d).mkdir(parents=True, exist_ok=True)
+    def _scraper_name(meta_file_name: str) -> str:
+        # YYYYMMDD-hhmmss-SCRAPER-SHA256PREFIX.json or YYYYMMDD-hhmmss-SCRAPER@SHOW-SHA256PREFIX.json
+        return meta_file_name[: -len(".json")].split("-", 2)[2].rsplit("-", 1)[0].split("@", 1)[0]
 
-    def store(self, scraper: Scraper, response: Response):
-        meta_path = self._meta_path(scraper.name, response.meta)
-        meta_exists = os.path.exists(meta_path)
-        payload_path = self._payload_path(response.meta.sha256)
-        payload_exists = os.path.exists(payload_path)
-
-        if not meta_exists:
-            with open(meta_path, "w") as fp:
-                d = asdict(response.meta)
-                json.dump(d, fp, sort_keys=True, cls=CustomEncoder)
-        if not payload_exists:
-            with open(payload_path, "wb") as fp:
-                fp.write(response.data)
-
-    def find(self) -> Iterable[Response]:
-        for root, _, file_names in os.walk(self._meta_dir):
-            for file_name in file_names:
-                with open(os.path.join(root, file_name), "r") as fp:
-                    yield self._hydrate(json.load(fp))
-
-    def _hydrate(self, d: Dict) -> Response:
-        meta = ResponseMeta(
+    @staticmethod
+    def _show(meta_file_name: str) -> Optional[str]:
+        name = meta_file_name[: -len(".json")].split("-", 2)[2].rsplit("-", 1)[0]
+        return name.split("@", 1)[1] if "@" in name else None
+
+    def shows(self) -> Set[str]:
+        """
+        tags of all stored responses, read from the meta file names without opening them
+        """
+        if self._meta_index is not None and len(self._meta_index) > 0:
+            return self._meta_index.shows()
+        ret = set()
+        for _, _, file_names in os.walk(self._meta_dir):
+            ret.update(self._show(file_name) for file_name in file_names if file_name.endswith(".json"))
+        ret.discard(None)
+
+        return ret
+
+    def find(
+        self,
+        scraper_name: Optional[str] = None,
+        url_pattern: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        ordered: bool = True,
+        show: Optional[str] = None,
+    ) -> Iterable[Response]:
+        yield from self.hydrate(
+            (
+                meta
+                for _, meta in self.find_meta(
+                    scraper_name=scraper_name, url_pattern=url_pattern, since=since, until=until, show=show
+                )
+            ),
+            ordered=ordered,
+        )
+
+    def find_meta(
+        self,
+        exclude: Container[str] = frozenset(),
+        scraper_name: Optional[str] = None,
+        url_pattern: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        show: Optional[str] = None,
+    ) -> Iterable[Tuple[str, ResponseMeta]]:
+        """
+        yields tuples of meta file path (relative to the meta directory) and parsed meta, meta files whose
+        relative path is in `exclude` are skipped without being opened, see `MetaIndex.find` for the filters
+
+        An empty meta index (e.g. a new `META_INDEX_FILE_NAME`) of a meta directory which isn't empty is
+        rebuilt first, so it never hides stored responses.
+        """
+        if self._meta_index is not None:
+            if len(self._meta_index) == 0 and self._has_meta_files():
+                self.rebuild_index()
+            for path, meta in self._meta_index.find(scraper_name, url_pattern, since, until, show):
+                if path not in exclude:
+                    yield path, meta
+            return
+
+        for path, meta in self._walk_meta(exclude, scraper_name):
+            if url_pattern is not None and not fnmatch.fnmatchcase(meta.url or "", url_pattern):
+                continue
+            if since is not None and meta.timestamp < since:
+                continue
+            if until is not None and meta.timestamp >= until:
+                continue
+            if show is not None and meta.show != show:
+                continue
+            yield path, meta
+
+    def _walk_meta(
+        self, exclude: Container[str] = frozenset(), scraper_name: Optional[str] = None
+    ) -> Iterable[Tuple[str, ResponseMeta]]:
+        def candidates() -> Iterable[Tuple[str, str]]:
+            for root, _, file_names in os.walk(self._meta_dir):
+                for file_name in file_names:
+                    if not file_name.endswith(".json"):
+                        continue
+                    if scraper_name is not None and self._scraper_name(file_name) != scraper_name:
+                        continue
+                    full_path = os.path.join(root, file_name)
+                    path = self._relative_meta_path(full_path)
+                    if path in exclude:
+                        continue
+                    yield path, full_path
+
+        yield from self._map_read_ahead(lambda c: (c[0], self._read_meta(c[1])), candidates())
+
+    def _has_meta_files(self) -> bool:
+        for _, _, file_names in os.walk(self._meta_dir):
+            if any(file_name.endswith(".json") for file_name in file_names):
+                return True
+        return False
+
+    def _read_meta(self, full_path: str) -> ResponseMeta:
+        with open(full_path, "rb") as fp:
+            return self._parse_meta(self._decoder.decode(fp.read()))
+
+    def rebuild_index(self) -> int:
+        if self._meta_index is None:
+            raise ValueError("No meta index configured.")
+        self._meta_index.replace_all(
+            (path, self._scraper_name(os.path.basename(path)), meta) for path, meta in self._walk_meta()
+        )
+
+        return len(self._meta_index)
+
+    def hydrate(self, metas: Iterable[ResponseMeta], ordered: bool = True) -> Iterable[Response]:
+        """
+        `ordered=False` allows yielding responses in the order their payloads finished loading
+        """
+        yield from self._map_read_ahead(self._hydrate, metas, ordered)
+
+    def _map_read_ahead(self, fn: Callable[[T], R], items: Iterable[T], ordered: bool = True) -> Iterable[R]:
+        if self._workers <= 1:
+            yield from map(fn, items)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._workers) as executor:
+            pending = collections.deque()
+            try:
+                for item in items:
+                    if len(pending) >= self._read_ahead:
+                        yield from self._complete(pending, ordered)
+                    pending.append(executor.submit(fn, item))
+                while pending:
+                    yield from self._complete(pending, ordered)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _complete(pending: collections.deque, ordered: bool) -> Iterable:
+        if ordered:
+            yield pending.popleft().result()
+            return
+
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+        for future in done:
+            yield future.result()
+
+    @staticmethod
+    def _parse_meta(d: Dict) -> ResponseMeta:
+        return ResponseMeta(
             sha256=d["sha256"],
             url=d["url"],
             timestamp=datetime.datetime.fromisoformat(d["timestamp"]),
+            show=d.get("show"),
         )
-        payload_path = self._payload_path(meta.sha256)
-        with open(payload_path, "rb") as fp:
-            return Response(meta=meta, data=fp.read())
+
+    def _hydrate(self, meta: ResponseMeta) -> Response:
+        return Response(meta=meta, data=self._payload_store.read(meta.sha256))
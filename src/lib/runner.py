@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Optional, Type, Any, Dict, Tuple
+
+from lib.factory import LoggerFactory
+from lib.model import Response
+from lib.responses import ResponseManager
+from lib.scraper import Scraper, SeleniumFactory, RecaptchaSolverFactory
+from lib.telemetry import ScraperTelemetry
+
+
+@dataclass
+class ScraperResult:
+    # of the job, see `job_name`
+    name: str
+    scraper_name: str
+    status: str = "pending"
+    responses: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    telemetry: Optional[ScraperTelemetry] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == "succeeded"
+
+
+def job_name(scraper_cls: Type[Scraper], config: Any) -> str:
+    """
+    the scraper name, suffixed with the account for configs of one of several accounts of a provider, names
+    the browser profile, telemetry and log lines while responses are stored under the scraper name
+    """
+    account = getattr(config, "account", None)
+    return scraper_cls.__name__ if account is None else f"{scraper_cls.__name__}-{account}"
+
+
+def _terminate(signum, frame):
+    # unwinds the stack, so the browser is closed when the runner terminates a worker
+    raise SystemExit(128 + signum)
+
+
+def _run_scraper(
+    scraper_cls: Type[Scraper],
+    config: Any,
+    selenium_factory: SeleniumFactory,
+    anticaptcha_api_key: Optional[str],
+    debug: bool,
+    scraper_kwargs: Dict[str, Any],
+    results: multiprocessing.Queue,
+):
+    signal.signal(signal.SIGTERM, _terminate)
+    name = job_name(scraper_cls, config)
+    telemetry = ScraperTelemetry(name)
+    scraper = None
+    count = 0
+    try:
+        scraper = scraper_cls(
+            logger=LoggerFactory.get(debug),
+            selenium_factory=selenium_factory,
+            config=config,
+            recaptcha_solver=RecaptchaSolverFactory.get(anticaptcha_api_key),
+            name=scraper_cls.__name__,
+            telemetry=telemetry,
+            profile_name=name,
+            **scraper_kwargs,
+        )
+        for response in scraper.run():
+            results.put(("response", name, response))
+            count += 1
+        results.put(("succeeded", name, count))
+    except Exception as e:
+        results.put(("failed", name, f"{e.__class__.__name__}: {e}"))
+    finally:
+        if scraper is not None:
+            scraper.close()
+        results.put(("telemetry", name, telemetry))
+
+
+class ConcurrentScraperRunner:
+    """
+    runs every scraper in a worker process with its own browser, at most `concurrency` at once, a scraper
+    configured with several accounts runs once per account
+
+    Responses are stored as soon as a worker sends them, so a scraper which runs into `timeout` (in seconds)
+    and gets terminated keeps everything it captured until then.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        response_manager: ResponseManager,
+        selenium_factory: SeleniumFactory,
+        anticaptcha_api_key: Optional[str],
+        concurrency: int,
+        timeout: float,
+        debug: bool = False,
+        scraper_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        `scraper_kwargs` are passed on to the constructor of every scraper
+        """
+        self._logger = logger
+        self._response_manager = response_manager
+        self._selenium_factory = selenium_factory
+        self._anticaptcha_api_key = anticaptcha_api_key
+        self._concurrency = max(1, concurrency)
+        self._timeout = timeout
+        self._debug = debug
+        self._scraper_kwargs = scraper_kwargs or {}
+
+    def run(
+        self,
+        scraper_configs: List[Tuple[Type[Scraper], Any]],
+        scraper_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> List[ScraperResult]:
+        """
+        `scraper_kwargs` by job name are passed on to that scraper on top of the ones of the runner
+        """
+        scraper_kwargs = scraper_kwargs or {}
+        results = {}
+        for cls, config in scraper_configs:
+            name = job_name(cls, config)
+            results[name] = ScraperResult(name, cls.__name__, telemetry=ScraperTelemetry(name))
+        messages = multiprocessing.Queue()
+        waiting = list(scraper_configs)
+        running: Dict[str, Tuple[multiprocessing.Process, float]] = {}
+        while waiting or running:
+            while waiting and len(running) < self._concurrency:
+                scraper_cls, config = waiting.pop(0)
+                name = job_name(scraper_cls, config)
+                self._logger.info(f"Starting {name}...")
+                process = multiprocessing.Process(
+                    target=_run_scraper,
+                    args=(
+                        scraper_cls,
+                        config,
+                        self._selenium_factory,
+                        self._anticaptcha_api_key,
+                        self._debug,
+                        {**self._scraper_kwargs, **scraper_kwargs.get(name, {})},
+                        messages,
+                    ),
+                    name=name,
+                )
+                process.start()
+                running[name] = (process, time.monotonic())
+
+            self._receive(messages, results, timeout=0.5)
+            for name, (process, started) in list(running.items()):
+                seconds = time.monotonic() - started
+                if process.is_alive() and seconds > self._timeout:
+                    self._logger.warning(f"{name} timed out after {seconds:.0f}s, terminating...")
+                    self._stop(process, messages, results)
+                    if results[name].status == "pending":
+                        results[name].status = "timed out"
+                if process.is_alive():
+                    continue
+                # everything a worker sent is readable once it exited
+                self._receive(messages, results)
+                del running[name]
+                result = results[name]
+                result.seconds = seconds
+                if result.status == "pending":
+                    result.status = "failed"
+                    result.error = f"worker exited with code {process.exitcode}"
+                result.telemetry.status = result.status
+                self._logger.info(f"{name} {result.status} after {seconds:.1f}s.")
+
+        return list(results.values())
+
+    def _receive(
+        self, messages: multiprocessing.Queue, results: Dict[str, ScraperResult], timeout: float = 0
+    ):
+        # everything which is already queued is stored as one batch
+        responses = []
+        try:
+            while True:
+                try:
+                    kind, name, payload = messages.get(timeout=timeout) if timeout else messages.get_nowait()
+                except queue.Empty:
+                    return
+                timeout = 0
+                result = results[name]
+                if kind == "response":
+                    responses.append((name, payload))
+                    result.responses += 1
+                elif kind == "telemetry":
+                    result.telemetry.merge(payload)
+                elif kind == "succeeded":
+                    result.status = "succeeded"
+                elif kind == "failed" and result.status == "pending":
+                    result.status = "failed"
+                    result.error = payload
+        finally:
+            self._store(responses, results)
+
+    def _store(self, responses: List[Tuple[str, Response]], results: Dict[str, ScraperResult]):
+        by_name = defaultdict(list)
+        for name, response in responses:
+            by_name[name].append(response)
+        for name, scraped in by_name.items():
+            result = results[name]
+            with result.telemetry.phase("store") as timing:
+                self._response_manager.store_many((result.scraper_name, response) for response in scraped)
+                for response in scraped:
+                    timing.add(response)
+
+    def _stop(
+        self,
+        process: multiprocessing.Process,
+        messages: multiprocessing.Queue,
+        results: Dict[str, ScraperResult],
+    ):
+        process.terminate()
+        # keep reading, a worker can't exit before its queued responses have been written to the pipe
+        deadline = time.monotonic() + 10
+        while process.is_alive() and time.monotonic() < deadline:
+            self._receive(messages, results, timeout=0.1)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def summarize(self, results: List[ScraperResult]):
+        width = max([12] + [len(result.name) + 2 for result in results])
+        self._logger.info(f"{'scraper':<{width}}{'status':<12}{'responses':>10}{'seconds':>10}")
+        for result in results:
+            self._logger.info(
+                f"{result.name:<{width}}{result.status:<12}{result.responses:>10}{result.seconds:>10.1f}"
+                + (f"  {result.error}" if result.error else "")
+            )
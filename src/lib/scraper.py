@@ -3,43 +3,125 @@
 import abc
 import json
 import logging
+import os.path
+import pathlib
+import re
 import time
-from json import JSONDecodeError
-from typing import Iterable, Dict, Optional
+from typing import Iterable, Dict, Optional, List, Callable, Tuple
 
 from anticaptchaofficial.recaptchav2proxyless import recaptchaV2Proxyless
 from selenium import webdriver
-from selenium.common import WebDriverException
+from selenium.common import TimeoutException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.wait import WebDriverWait
 
+from lib.capture import ResponseCapture
+from lib.fetcher import HttpSession
 from lib.model import Response
+from lib.telemetry import ScraperTelemetry
 
 
 class SeleniumFactory:
+    IMPLICIT_WAIT = 5
+    # images, media, fonts and trackers, none of them are needed to navigate the dashboards
+    BLOCKED_URL_PATTERNS = [
+        "*.png",
+        "*.jpg",
+        "*.jpeg",
+        "*.gif",
+        "*.webp",
+        "*.ico",
+        "*.mp3",
+        "*.mp4",
+        "*.woff",
+        "*.woff2",
+        "*.ttf",
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*facebook.net*",
+        "*hotjar.com*",
+        "*sentry.io*",
+    ]
+
     # https://storage.googleapis.com/chrome-for-testing-public/138.0.7204.184/win64/chromedriver-win64.zip
-    def __init__(self, chrome_executable_path: str):
+    def __init__(
+        self,
+        chrome_executable_path: str,
+        profile_dir: Optional[str] = None,
+        logout: bool = True,
+        lightweight: bool = False,
+        blocked_url_patterns: Optional[List[str]] = None,
+    ):
+        """
+        with a `profile_dir`, every scraper gets a persistent browser profile in a subdirectory of it, so
+        cookies survive the run and scrapers can skip the login as long as the session is valid, in that case
+        scrapers only log out if `logout` is set
+
+        `lightweight` runs Chrome headless, blocks requests matching `blocked_url_patterns` (defaults to
+        `BLOCKED_URL_PATTERNS`) and only records network events in the performance log
+        """
         self._chrome_executable_path = chrome_executable_path
+        self._profile_dir = profile_dir
+        self._logout = logout
+        self._lightweight = lightweight
+        self._blocked_url_patterns = (
+            blocked_url_patterns if blocked_url_patterns is not None else self.BLOCKED_URL_PATTERNS
+        )
+
+    @property
+    def keeps_sessions(self) -> bool:
+        return self._profile_dir is not None and not self._logout
 
-    def produce(self):
+    def produce(self, profile_name: Optional[str] = None):
         options = Options()
         options.binary_location = self._chrome_executable_path
         options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        if self._profile_dir is not None and profile_name is not None:
+            profile_path = os.path.abspath(os.path.join(self._profile_dir, profile_name))
+            pathlib.Path(profile_path).mkdir(parents=True, exist_ok=True)
+            options.add_argument(f"--user-data-dir={profile_path}")
+        if self._lightweight:
+            options.add_argument("--headless=new")
+            options.add_argument("--window-size=1920,1080")
+            options.add_argument("--disable-extensions")
+            options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
 
         selenium = webdriver.Chrome(options=options)
-        selenium.implicitly_wait(5)
+        selenium.implicitly_wait(self.IMPLICIT_WAIT)
+        if self._lightweight and self._blocked_url_patterns:
+            selenium.execute_cdp_cmd("Network.enable", {})
+            selenium.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self._blocked_url_patterns})
         return selenium
 
 
+class RecaptchaSolverFactory:
+    @staticmethod
+    def get(anticaptcha_api_key: Optional[str]) -> Optional[recaptchaV2Proxyless]:
+        if not anticaptcha_api_key:
+            return None
+        recaptcha_solver = recaptchaV2Proxyless()
+        recaptcha_solver.set_verbose(1)
+        recaptcha_solver.set_key(anticaptcha_api_key)
+        return recaptcha_solver
+
+
 class ScraperException(Exception):
     pass
 
 
 class Scraper(abc.ABC):
-    def __init__(self, name: str, recaptcha_solver: Optional[recaptchaV2Proxyless], **kwargs):
+    def __init__(
+        self,
+        name: str,
+        recaptcha_solver: Optional[recaptchaV2Proxyless],
+        telemetry: Optional[ScraperTelemetry] = None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self._name = name
         self._recaptcha_solver = recaptcha_solver
+        self.telemetry = telemetry or ScraperTelemetry(name)
 
     @property
     def name(self):
@@ -54,41 +136,183 @@ class Scraper(abc.ABC):
     def postprocess(self):
         pass
 
+    def close(self):
+        pass
+
+    def run(self) -> Iterable[Response]:
+        """
+        prepares, yields all payloads and cleans up, recording every phase in `telemetry`
+        """
+        try:
+            with self.telemetry.phase("prepare"):
+                self.prepare()
+            with self.telemetry.phase("extract_payloads") as timing:
+                for response in self.extract_payloads():
+                    timing.add(response)
+                    yield response
+            with self.telemetry.phase("postprocess"):
+                self.postprocess()
+        except Exception:
+            self.telemetry.status = "failed"
+            raise
+        self.telemetry.status = "succeeded"
+
 
 class Selenium:
-    def __init__(self, logger: logging.Logger, selenium_factory: SeleniumFactory, **kwargs):
+    def __init__(
+        self,
+        logger: logging.Logger,
+        selenium_factory: SeleniumFactory,
+        profile_name: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        the browser profile is named after the scraper unless `profile_name` is given, e.g. per account
+        """
         super().__init__(**kwargs)
         self._logger = logger
-        self._selenium = selenium_factory.produce()
+        with self.telemetry.phase("browser_startup"):
+            self._selenium = selenium_factory.produce(profile_name or kwargs.get("name"))
+        self._keep_session = selenium_factory.keeps_sessions
+        # network events drained from the performance log but not consumed yet
+        self._network_messages: List[Dict] = []
+        self._log_entries = 0
+        self._log_bytes = 0
+        self._page_load_seconds: Optional[float] = None
+
+    def close(self):
+        page_load = f"{self._page_load_seconds:.2f}s" if self._page_load_seconds is not None else "unknown"
+        self._logger.info(
+            f"{self.__class__.__name__} ➤ Read {self._log_entries} performance log entries "
+            f"({self._log_bytes / 1024:.0f} KiB), dashboard page load {page_load}."
+        )
+        with self.telemetry.phase("close"):
+            self._selenium.quit()
+
+    def _record_page_load(self):
+        try:
+            with self.telemetry.phase("page_load"):
+                self._wait_for(
+                    lambda: self._selenium.execute_script("return document.readyState;") == "complete"
+                )
+        except TimeoutException:
+            return
+        duration = self._selenium.execute_script(
+            "const n = performance.getEntriesByType('navigation'); return n.length ? n[0].duration : null;"
+        )
+        self._page_load_seconds = duration / 1000 if duration is not None else None
 
-    def _wait_until(self, elem):
-        wait = WebDriverWait(self._selenium, timeout=2)
-        wait.until(lambda _: elem.is_displayed())
-        time.sleep(1)
+    def _read_performance_log(self) -> List[Dict]:
+        entries = self._selenium.get_log("performance")
+        self._log_entries += len(entries)
+        self._log_bytes += sum(len(entry["message"]) for entry in entries)
+        return entries
+
+    def _wait_until(self, elem, timeout: float = 5):
+        wait = WebDriverWait(self._selenium, timeout=timeout)
+        wait.until(lambda _: elem.is_displayed() and elem.is_enabled())
+
+    def _wait_for(self, condition: Callable[[], bool], timeout: float = 10):
+        WebDriverWait(self._selenium, timeout=timeout, poll_frequency=0.1).until(lambda _: condition())
+
+    def _session_valid(
+        self, url: str, logged_in: Tuple[str, str], login_url: str, timeout: float = 10
+    ) -> bool:
+        """
+        opens `url` and waits until either an element matching the `logged_in` locator shows up or the
+        browser got redirected to `login_url`
+        """
+        with self.telemetry.phase("session_probe"):
+            self._selenium.get(url)
+            self._selenium.implicitly_wait(0)
+            try:
+                self._wait_for(
+                    lambda: self._selenium.find_elements(*logged_in)
+                    or login_url in self._selenium.current_url,
+                    timeout,
+                )
+                return len(self._selenium.find_elements(*logged_in)) > 0
+            except TimeoutException:
+                return False
+            finally:
+                self._selenium.implicitly_wait(SeleniumFactory.IMPLICIT_WAIT)
+
+    def _poll_performance_log(self):
+        for entry in self._read_performance_log():
+            message = json.loads(entry["message"])["message"]
+            if message["method"] in [
+                "Network.requestWillBeSent",
+                "Network.responseReceived",
+                "Network.loadingFinished",
+            ]:
+                self._network_messages.append(message)
+
+    def _export_session(self, pattern: str) -> Tuple[HttpSession, List[str]]:
+        """
+        all cookies of the browser plus the headers of the latest request with a URL matching `pattern`, and
+        the URLs of all matching requests since the last flush
+        """
+        self._poll_performance_log()
+        requests = [
+            message["params"]["request"]
+            for message in self._network_messages
+            if message["method"] == "Network.requestWillBeSent"
+            and re.search(pattern, message["params"]["request"]["url"])
+        ]
+        cookies = self._selenium.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        headers = dict(requests[-1]["headers"]) if requests else {}
+        headers.setdefault("User-Agent", self._selenium.execute_script("return navigator.userAgent;"))
+
+        return HttpSession(cookies, headers), list(dict.fromkeys(request["url"] for request in requests))
 
     def _flush_performance_log(self):
-        list(self._selenium.get_log("performance"))
+        self._read_performance_log()
+        self._network_messages = []
 
-    def _get_performance_log_response_messages(self) -> Iterable[Dict]:
-        def unpack_message(entry):
-            return json.loads(entry["message"])["message"]
+    def _wait_for_responses(self, expected: Iterable[str], timeout: float = 10) -> List[str]:
+        """
+        polls the performance log until, for every regular expression in `expected`, a response with a
+        matching URL has finished loading, returns the expressions which didn't match before `timeout`
+
+        Only responses which finished after the previous poll count, so call this right after the click which
+        triggers them.
+        """
+        missing = [re.compile(pattern) for pattern in expected]
+        seen = len(self._network_messages)
+        deadline = time.monotonic() + timeout
+        while True:
+            self._poll_performance_log()
+            finished = {
+                message["params"]["requestId"]
+                for message in self._network_messages[seen:]
+                if message["method"] == "Network.loadingFinished"
+            }
+            urls = [
+                self._get_performance_log_url(message)
+                for message in self._network_messages
+                if message["method"] == "Network.responseReceived"
+                and message["params"]["requestId"] in finished
+            ]
+            missing = [pattern for pattern in missing if not any(pattern.search(url) for url in urls)]
+            if not missing or time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        for pattern in missing:
+            self._logger.warning(
+                f"{self.__class__.__name__} ➤ No response matching {pattern.pattern} within {timeout}s."
+            )
 
-        browser_log = self._selenium.get_log("performance")
-        messages = [unpack_message(entry) for entry in browser_log]
-        yield from (message for message in messages if message["method"] == "Network.responseReceived")
+        return [pattern.pattern for pattern in missing]
+
+    def _capture(self, url_pattern: str) -> ResponseCapture:
+        return ResponseCapture(
+            self._logger,
+            self._selenium,
+            url_pattern,
+            read_log=self._read_performance_log,
+            name=self.__class__.__name__,
+        )
 
     @staticmethod
     def _get_performance_log_url(message: Dict) -> str:
         return message["params"]["response"]["url"]
-
-    def _get_performance_log_body(self, message: Dict) -> Optional[Dict]:
-        try:
-            body = self._selenium.execute_cdp_cmd(
-                "Network.getResponseBody", {"requestId": message["params"]["requestId"]}
-            )
-        except WebDriverException:
-            return None
-        try:
-            return json.loads(body["body"])
-        except JSONDecodeError:
-            return None
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import collections
+import datetime
+import functools
+import itertools
+import operator
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Iterable, Union
+
+from lib.model import Provider, DataPoint, DataPointStrDict, DATA_POINT_METRICS, sorted_providers
+
+Number = Union[int, float]
+
+
+def to_ordinal(date: str) -> int:
+    return datetime.date.fromisoformat(date).toordinal()
+
+
+def from_ordinal(ordinal: int) -> str:
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+def numeric_array(values: List[Number]) -> array:
+    return array("d" if any(isinstance(v, float) for v in values) else "q", values)
+
+
+def forward_fill(values: Iterable[Number], default: Number = 0) -> List[Number]:
+    """
+    replaces every falsy value with the last truthy value before it (or `default`), runs entirely in C:
+    the index of the last truthy value is a running maximum over the indices of all truthy values
+    """
+    padded = [default]
+    padded.extend(values)
+    truthy = map(operator.truth, itertools.islice(padded, 1, None))
+    truthy_indices = map(operator.mul, range(1, len(padded)), truthy)
+    return list(map(padded.__getitem__, itertools.accumulate(truthy_indices, max)))
+
+
+@dataclass
+class Column:
+    """
+    values of missing days are stored as 0 and flagged in the mask
+    """
+
+    values: array
+    mask: bytearray
+
+    @staticmethod
+    def from_values(values: List[Optional[Number]]) -> "Column":
+        return Column(
+            numeric_array([0 if v is None else v for v in values]), bytearray(v is not None for v in values)
+        )
+
+    @staticmethod
+    def dense(values: List[Number]) -> "Column":
+        return Column(numeric_array(values), bytearray(b"\x01") * len(values))
+
+    def get(self, idx: int) -> Optional[Number]:
+        return self.values[idx] if self.mask[idx] else None
+
+
+@dataclass
+class ProviderSeries:
+    provider: Provider
+    days: array
+    columns: Dict[str, Column]
+
+    def __len__(self):
+        return len(self.days)
+
+
+class ColumnarStore:
+    """
+    time series of all providers keyed by day ordinals, one array per provider and metric
+    """
+
+    def __init__(self, by_provider: Dict[Provider, ProviderSeries]):
+        self._by_provider = by_provider
+
+    @staticmethod
+    def from_data_points(by_provider: Dict[Provider, DataPointStrDict]) -> "ColumnarStore":
+        ret = {}
+        for provider, by_date in by_provider.items():
+            items = sorted(by_date.items())
+            ret[provider] = ProviderSeries(
+                provider,
+                array("l", (to_ordinal(date) for date, _ in items)),
+                {
+                    metric: Column.from_values([getattr(data_point, metric) for _, data_point in items])
+                    for metric in DATA_POINT_METRICS
+                },
+            )
+
+        return ColumnarStore(ret)
+
+    def to_data_points(self) -> Dict[Provider, DataPointStrDict]:
+        ret = {}
+        for provider, series in self._by_provider.items():
+            ret[provider] = {
+                from_ordinal(day): DataPoint(
+                    provider, *(series.columns[metric].get(idx) for metric in DATA_POINT_METRICS)
+                )
+                for idx, day in enumerate(series.days)
+            }
+
+        return ret
+
+    def providers(self) -> List[Provider]:
+        return sorted_providers(self._by_provider.keys())
+
+    def series(self, provider: Provider) -> Optional[ProviderSeries]:
+        return self._by_provider.get(provider)
+
+    @functools.cached_property
+    def days(self) -> array:
+        ret = set()
+        for series in self._by_provider.values():
+            ret.update(series.days)
+        return array("l", sorted(ret))
+
+    @functools.cached_property
+    def dates(self) -> List[str]:
+        return list(map(from_ordinal, self.days))
+
+    @functools.cached_property
+    def _day_index(self) -> Dict[int, int]:
+        return dict(zip(self.days, range(len(self.days))))
+
+    def aligned(self, provider: Provider, metric: str) -> List[Number]:
+        """
+        values of `metric` for every day of the store, days the provider has no value for are 0
+        """
+        ret = [0] * len(self.days)
+        series = self._by_provider.get(provider)
+        if series is None:
+            return ret
+        column = series.columns[metric]
+        values = itertools.compress(column.values, column.mask)
+        positions = map(self._day_index.__getitem__, itertools.compress(series.days, column.mask))
+        collections.deque(map(ret.__setitem__, positions, values), maxlen=0)
+        return ret
+
+
+def largest_triangle_three_buckets(values: List[Optional[Number]], threshold: int) -> List[int]:
+    """
+    indices of at most `threshold` values which keep the shape of the series (Steinarsson's LTTB), the first
+    and last value are always kept, missing values count as 0
+    """
+    if threshold >= len(values) or threshold < 3:
+        return list(range(len(values)))
+    ys = [v or 0 for v in values]
+    ret = [0]
+    bucket_size = (len(ys) - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # the average of the next bucket is the third corner of the triangles
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(ys))
+        next_x = (end + next_end - 1) / 2
+        next_y = sum(ys[end:next_end]) / (next_end - end)
+        previous_y = ys[previous]
+        best, best_area = start, -1.0
+        for idx in range(start, end):
+            area = abs(
+                (previous - next_x) * (ys[idx] - previous_y) - (previous - idx) * (next_y - previous_y)
+            )
+            if area > best_area:
+                best, best_area = idx, area
+        ret.append(best)
+        previous = best
+    ret.append(len(ys) - 1)
+
+    return ret
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import itertools
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Iterable, Optional
+
+from lib.model import Response
+from lib.responses import ResponseManager
+from lib.scraper import Scraper
+
+
+class SyntheticScraper(Scraper):
+    """
+    stands in for a real scraper, responses are stored under its name
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name=name, recaptcha_solver=None)
+
+
+@dataclass
+class SyntheticShow:
+    show_id: str
+    tag: Optional[str]
+    # one value per day of history
+    followers: List[int]
+    listeners: List[int]
+    engaged_listeners: List[int]
+    streams: List[int]
+    starts: List[int]
+    consumption_hours: List[float]
+
+    @staticmethod
+    def generate(rnd: random.Random, show_id: str, tag: Optional[str], days: int) -> "SyntheticShow":
+        popularity = rnd.uniform(0.5, 2.0)
+        listeners = [
+            # a new episode every week draws more listeners
+            max(0, int(rnd.gauss(30 * popularity * (3 if day % 7 == 0 else 1), 8)))
+            for day in range(days)
+        ]
+        streams = [int(listener * rnd.uniform(1.1, 1.6)) for listener in listeners]
+        return SyntheticShow(
+            show_id,
+            tag,
+            list(itertools.accumulate(max(0, int(rnd.gauss(popularity, 1))) for _ in range(days))),
+            listeners,
+            [int(listener * rnd.uniform(0.4, 0.8)) for listener in listeners],
+            streams,
+            [int(stream * rnd.uniform(1.0, 1.3)) for stream in streams],
+            [round(stream * rnd.uniform(0.2, 0.6), 4) for stream in streams],
+        )
+
+    def window(self, first: int, day: int) -> "SyntheticShow":
+        return SyntheticShow(
+            self.show_id,
+            self.tag,
+            self.followers[first:day],
+            self.listeners[first:day],
+            self.engaged_listeners[first:day],
+            self.streams[first:day],
+            self.starts[first:day],
+            self.consumption_hours[first:day],
+        )
+
+
+class SyntheticDataGenerator:
+    """
+    writes Spotify and Amazon responses shaped like the real ones through `ResponseManager.store_many`, every
+    scrape covers the full history up to the previous day just like the "All time" charts
+
+    With probability `duplicate_ratio` a scrape returns exactly the payloads of the previous scrape, like a
+    provider which hasn't updated its numbers yet. With `window_days`, only the first scrape covers the full
+    history and every later one only that many days, like incremental scrapes. With several `shows`, their
+    responses are tagged `show-1`, `show-2` and so on, like with a scraper config file.
+    """
+
+    SPOTIFY_URL = (
+        "https://generic.wg.spotify.com/podcasters/v0/shows/{show_id}/{route}?start={start}&end={end}"
+    )
+    AMAZON_URL = "https://podcasters.amazon.com/api/metrics/podcast/{show_id}/metrics?from={start}&to={end}"
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        response_manager: ResponseManager,
+        years: float = 1,
+        scrapes_per_week: float = 1,
+        duplicate_ratio: float = 0.1,
+        shows: int = 1,
+        seed: int = 0,
+        end: Optional[datetime.date] = None,
+        window_days: Optional[int] = None,
+    ):
+        self._logger = logger
+        self._response_manager = response_manager
+        self._days = max(2, int(years * 365))
+        self._scrape_interval = datetime.timedelta(days=7 / scrapes_per_week)
+        self._duplicate_ratio = duplicate_ratio
+        self._random = random.Random(seed)
+        self._window_days = window_days
+        self._end = end or datetime.datetime.now(datetime.timezone.utc).date()
+        self._start = self._end - datetime.timedelta(days=self._days - 1)
+        self._shows = [
+            SyntheticShow.generate(
+                self._random,
+                f"{self._random.getrandbits(80):020x}",
+                f"show-{idx + 1}" if shows > 1 else None,
+                self._days,
+            )
+            for idx in range(shows)
+        ]
+
+    def generate(self) -> int:
+        spotify = SyntheticScraper("Spotify")
+        amazon = SyntheticScraper("Amazon")
+        previous: Dict[str, List[Response]] = {}
+        count = 0
+        timestamp = datetime.datetime.combine(self._start, datetime.time(6), datetime.timezone.utc)
+        timestamp += datetime.timedelta(days=1)
+        while timestamp.date() <= self._end:
+            day = (timestamp.date() - self._start).days
+            for scraper, responses in [
+                (spotify, self._spotify_responses),
+                (amazon, self._amazon_responses),
+            ]:
+                if scraper.name in previous and self._random.random() < self._duplicate_ratio:
+                    scraped = previous[scraper.name]
+                else:
+                    first = 0
+                    if self._window_days is not None and scraper.name in previous:
+                        first = max(0, day - self._window_days)
+                    scraped = previous[scraper.name] = list(responses(first, day))
+                for response in scraped:
+                    response.meta.timestamp = timestamp
+                self._response_manager.store_many((scraper.name, response) for response in scraped)
+                count += len(scraped)
+            timestamp += self._scrape_interval
+        self._logger.info(
+            f"Generated {count} response(s) for {len(self._shows)} show(s) "
+            f"and {self._days} day(s) of history."
+        )
+
+        return count
+
+    def _date(self, day: int) -> str:
+        return (self._start + datetime.timedelta(days=day)).isoformat()
+
+    def _spotify_responses(self, first: int, day: int) -> Iterable[Response]:
+        dates = [self._date(d) for d in range(first, day)]
+        for show in self._shows:
+            show = show.window(first, day)
+            for route, body in [
+                ("followers", {"counts": [{"date": d, "count": c} for d, c in zip(dates, show.followers)]}),
+                ("listeners", {"counts": [{"date": d, "count": c} for d, c in zip(dates, show.listeners)]}),
+                (
+                    "detailedStreams",
+                    {
+                        "detailedStreams": [
+                            {"date": d, "starts": starts, "streams": streams}
+                            for d, starts, streams in zip(dates, show.starts, show.streams)
+                        ]
+                    },
+                ),
+                (
+                    "consumption/daily",
+                    {
+                        "consumptionTimes": [
+                            {
+                                "date": d,
+                                "totalConsumptionHours": hours,
+                                "foregroundConsumptionHours": round(hours * 0.8, 4),
+                            }
+                            for d, hours in zip(dates, show.consumption_hours)
+                        ]
+                    },
+                ),
+            ]:
+                url = self.SPOTIFY_URL.format(
+                    show_id=show.show_id, route=route, start=dates[0], end=dates[-1]
+                )
+                yield self._tagged(Response.from_dict(body, url), show)
+
+    def _amazon_responses(self, first: int, day: int) -> Iterable[Response]:
+        dates = [self._date(d) for d in range(first, day)]
+        for show in self._shows:
+            follower_deltas = [b - a for a, b in zip([0] + show.followers, show.followers)][first:day]
+            show = show.window(first, day)
+            data = {
+                name: [{"time": f"{d}T00:00:00.000Z", "value": float(v // 5)} for d, v in zip(dates, values)]
+                for name, values in [
+                    ("playsTimeSeries", show.streams),
+                    ("startsTimeSeries", show.starts),
+                    ("listenersTimeSeries", show.listeners),
+                    ("followsTimeSeries", follower_deltas),
+                    ("engagedListenersTimeSeries", show.engaged_listeners),
+                ]
+            }
+            data["playsTotals"] = sum(show.streams) // 5
+            data["listenersTotals"] = sum(show.listeners) // 5
+            url = self.AMAZON_URL.format(show_id=show.show_id, start=dates[0], end=dates[-1])
+            yield self._tagged(Response.from_dict({"data": data}, url), show)
+
+    @staticmethod
+    def _tagged(response: Response, show: SyntheticShow) -> Response:
+        response.meta.show = show.tag
+        return response
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import contextlib
+import datetime
+import json
+import logging
+import os.path
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Iterator, Optional
+
+from lib.model import Response
+from lib.payload_store import write_files_atomically
+
+
+@dataclass
+class PhaseTiming:
+    seconds: float = 0.0
+    calls: int = 0
+    responses: int = 0
+    bytes: int = 0
+
+    def add(self, response: Response):
+        self.responses += 1
+        self.bytes += len(response.data)
+
+    def merge(self, other: "PhaseTiming"):
+        self.seconds += other.seconds
+        self.calls += other.calls
+        self.responses += other.responses
+        self.bytes += other.bytes
+
+
+class ScraperTelemetry:
+    """
+    durations, response counts and captured bytes of the phases of one scraper
+
+    Phases opened inside another phase are named after it, e.g. `prepare.login`, and phases which run several
+    times add up.
+    """
+
+    def __init__(self, scraper_name: str):
+        self.scraper_name = scraper_name
+        self.status = "pending"
+        self.phases: Dict[str, PhaseTiming] = {}
+        self._stack: List[str] = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseTiming]:
+        self._stack.append(name)
+        timing = self.phases.setdefault(".".join(self._stack), PhaseTiming())
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.seconds += time.perf_counter() - start
+            timing.calls += 1
+            self._stack.pop()
+
+    def merge(self, other: "ScraperTelemetry"):
+        for name, timing in other.phases.items():
+            self.phases.setdefault(name, PhaseTiming()).merge(timing)
+        if other.status != "pending":
+            self.status = other.status
+
+    def dict(self) -> Dict:
+        return {
+            "scraper": self.scraper_name,
+            "status": self.status,
+            "phases": {name: asdict(timing) for name, timing in self.phases.items()},
+        }
+
+
+class TelemetryWriter:
+    """
+    writes the telemetry of a run as `scrape-YYYYMMDD-hhmmss.json` and replaces `PROMETHEUS_FILE_NAME`, point
+    the textfile collector of the Prometheus node exporter to `directory` to pick it up
+    """
+
+    PROMETHEUS_FILE_NAME = "sonifree_scrape.prom"
+    METRICS = [
+        ("seconds", "sonifree_scrape_phase_seconds", "Seconds spent in a phase of a scraper."),
+        ("calls", "sonifree_scrape_phase_calls", "Number of times a phase of a scraper ran."),
+        ("responses", "sonifree_scrape_phase_responses", "Responses captured or stored in a phase."),
+        ("bytes", "sonifree_scrape_phase_bytes", "Bytes of the responses captured or stored in a phase."),
+    ]
+
+    def __init__(self, logger: logging.Logger, directory: str):
+        self._logger = logger
+        self._directory = directory
+
+    def write(self, telemetries: List[ScraperTelemetry], started: Optional[datetime.datetime] = None):
+        started = started or datetime.datetime.now(datetime.timezone.utc)
+        json_file_name = os.path.join(self._directory, f"scrape-{started.strftime('%Y%m%d-%H%M%S')}.json")
+        prometheus_file_name = os.path.join(self._directory, self.PROMETHEUS_FILE_NAME)
+        report = {
+            "started": started.isoformat(),
+            "scrapers": [telemetry.dict() for telemetry in telemetries],
+        }
+        write_files_atomically(
+            [
+                (json_file_name, json.dumps(report, indent=4).encode("utf-8")),
+                (prometheus_file_name, self.prometheus(telemetries, started).encode("utf-8")),
+            ],
+            overwrite=True,
+        )
+        self._logger.info(f"Wrote {json_file_name}.")
+        self._logger.info(f"Wrote {prometheus_file_name}.")
+
+    def prometheus(self, telemetries: List[ScraperTelemetry], started: datetime.datetime) -> str:
+        lines = [
+            "# HELP sonifree_scrape_started_seconds Start of the last scrape run as a Unix timestamp.",
+            "# TYPE sonifree_scrape_started_seconds gauge",
+            f"sonifree_scrape_started_seconds {started.timestamp():.0f}",
+            "# HELP sonifree_scrape_succeeded Whether a scraper succeeded in the last run.",
+            "# TYPE sonifree_scrape_succeeded gauge",
+        ]
+        for telemetry in telemetries:
+            labels = f'scraper="{self._escape(telemetry.scraper_name)}"'
+            lines.append(f"sonifree_scrape_succeeded{{{labels}}} {int(telemetry.status == 'succeeded')}")
+        for field, metric, description in self.METRICS:
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} gauge")
+            for telemetry in telemetries:
+                for name, timing in telemetry.phases.items():
+                    labels = f'scraper="{self._escape(telemetry.scraper_name)}",phase="{self._escape(name)}"'
+                    lines.append(f"{metric}{{{labels}}} {getattr(timing, field)}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
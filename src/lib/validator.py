@@ -1,32 +1,171 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import datetime
 import logging
-from typing import Dict
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
 
-from lib.factory import DateFactory
-from lib.model import DataPoint, Provider
+from lib.model import Provider, DataPointStrDict, DATA_POINT_METRICS
+from lib.series import ColumnarStore, ProviderSeries, Column, from_ordinal
+
+
+@dataclass
+class Issue:
+    # "missing", "decrease", "stale" or "jump"
+    kind: str
+    provider: str
+    start: str
+    end: str
+    metric: Optional[str] = None
+    value: Optional[float] = None
+    previous: Optional[float] = None
+
+
+@dataclass
+class ProviderSummary:
+    first_date: str
+    last_date: str
+    days: int
+    missing_days: int
+
+
+@dataclass
+class ValidationReport:
+    first_date: Optional[str] = None
+    last_date: Optional[str] = None
+    providers: Dict[str, ProviderSummary] = field(default_factory=dict)
+    issues: List[Issue] = field(default_factory=list)
+
+    def dict(self) -> Dict:
+        return asdict(self)
 
 
 class Validator:
-    def __init__(self, logger: logging.Logger):
-        self._logger = logger
+    """
+    checks every provider and metric in a single pass over its sorted days
 
-    def validate(self, by_date: Dict[str, Dict[Provider, DataPoint]]):
-        dates = DateFactory.list_of_dates(by_date.keys())
-        current = min(dates)
-        while current < max(dates):
-            current += datetime.timedelta(days=1)
-            if current.strftime("%Y-%m-%d") not in by_date.keys():
-                self._logger.warning(f"Date {current} missing.")
+    Reported are days a provider has no data for (up to the last day of any provider, so a provider which
+    stopped delivering shows up as well), cumulative values which decrease or stay the same for `stale_days`
+    days or longer, and days whose increase is more than `jump_factor` times the moving average of the
+    previous increases (at least `jump_minimum`, after `warmup_days` days). Follower counts may go down and
+    are only checked for jumps.
+    """
 
-        self._logger.info(
-            f"Validated {len(by_date)} rows ({int((max(dates) - min(dates)).total_seconds() / 60 / 60 / 24)} day(s))."
-        )
+    # their metrics are cumulative after `Transformer.finalize`, except for Spotify follower counts
+    CUMULATIVE_PROVIDERS = [Provider.SPOTIFY, Provider.AMAZON]
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        stale_days: int = 7,
+        jump_factor: float = 10,
+        jump_minimum: float = 10,
+        warmup_days: int = 7,
+        smoothing: float = 0.1,
+    ):
+        self._logger = logger
+        self._stale_days = stale_days
+        self._jump_factor = jump_factor
+        self._jump_minimum = jump_minimum
+        self._warmup_days = warmup_days
+        self._smoothing = smoothing
 
-        for date, by_provider in by_date.items():
-            for data_point in by_provider.values():
+    def validate(self, by_provider: Dict[Provider, DataPointStrDict]) -> ValidationReport:
+        for by_date in by_provider.values():
+            for data_point in by_date.values():
                 if data_point.provider is None:
                     raise ValueError(f"Expected provider to be set on {data_point}")
                 if not isinstance(data_point.provider, Provider):
                     raise ValueError(f"Expected provider to be an enum on {data_point}")
+
+        return self.validate_columnar(ColumnarStore.from_data_points(by_provider))
+
+    def validate_columnar(self, store: ColumnarStore) -> ValidationReport:
+        report = ValidationReport()
+        days = store.days
+        if not days:
+            self._logger.info("Validated 0 rows (0 day(s)).")
+            return report
+        report.first_date, report.last_date = from_ordinal(days[0]), from_ordinal(days[-1])
+
+        for provider in store.providers():
+            if not isinstance(provider, Provider):
+                raise ValueError(f"Expected provider to be an enum: {provider}")
+            series = store.series(provider)
+            if len(series) == 0:
+                continue
+            missing = self._missing(series, days[-1], report.issues)
+            report.providers[provider.value] = ProviderSummary(
+                from_ordinal(series.days[0]), from_ordinal(series.days[-1]), len(series), missing
+            )
+            for metric in DATA_POINT_METRICS:
+                cumulative = provider in self.CUMULATIVE_PROVIDERS and metric != "follower_count"
+                self._check_column(series, metric, cumulative, report.issues)
+
+        self._logger.info(f"Validated {len(days)} rows ({days[-1] - days[0]} day(s)).")
+        for (kind, provider), count in sorted(Counter((i.kind, i.provider) for i in report.issues).items()):
+            if kind != "missing":
+                self._logger.warning(f"{provider}: {count} {kind} issue(s).")
+
+        return report
+
+    def _missing(self, series: ProviderSeries, last_day: int, issues: List[Issue]) -> int:
+        provider = series.provider.value
+        count = 0
+        # the sentinel reports days after the last one of the provider
+        for previous, current in zip(series.days, [*series.days[1:], last_day + 1]):
+            if current - previous <= 1:
+                continue
+            start, end = from_ordinal(previous + 1), from_ordinal(current - 1)
+            count += current - previous - 1
+            issues.append(Issue("missing", provider, start, end))
+            self._logger.warning(f"{provider}: {start}..{end} missing ({current - previous - 1} day(s)).")
+
+        return count
+
+    def _check_column(self, series: ProviderSeries, metric: str, cumulative: bool, issues: List[Issue]):
+        column: Column = series.columns[metric]
+        if not any(column.values):
+            return
+        provider = series.provider.value
+        previous_day = previous = None
+        # first day and value of the current run of equal values
+        run_day = run_value = None
+        average = 0.0
+        seen = 0
+        for day, value, present in zip(series.days, column.values, column.mask):
+            if not present:
+                continue
+            if previous is not None:
+                if cumulative and value < previous:
+                    date = from_ordinal(day)
+                    issues.append(Issue("decrease", provider, date, date, metric, value, previous))
+                increase = (value - previous if cumulative else abs(value - previous)) / (day - previous_day)
+                threshold = max(self._jump_factor * average, self._jump_minimum)
+                if seen >= self._warmup_days and increase > threshold:
+                    date = from_ordinal(day)
+                    issues.append(Issue("jump", provider, date, date, metric, value, previous))
+                average += self._smoothing * (max(increase, 0) - average)
+                seen += 1
+            if cumulative and value != run_value:
+                self._stale(provider, metric, run_day, previous_day, run_value, issues)
+                run_day, run_value = day, value
+            previous_day, previous = day, value
+        if cumulative:
+            self._stale(provider, metric, run_day, previous_day, run_value, issues)
+
+    def _stale(
+        self,
+        provider: str,
+        metric: str,
+        first_day: Optional[int],
+        last_day: Optional[int],
+        value: Optional[float],
+        issues: List[Issue],
+    ):
+        # a run of a zero value is a metric which hasn't started yet
+        if first_day is None or not value or last_day - first_day + 1 < self._stale_days:
+            return
+        issues.append(
+            Issue("stale", provider, from_ordinal(first_day), from_ordinal(last_day), metric, value)
+        )
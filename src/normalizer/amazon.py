@@ -1,12 +1,58 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import json
-from typing import Dict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union, Type
 
 from lib.model import DataPoint, Response, Provider, ResponseMeta
 from normalizer.base import BaseNormalizationStrategy, NoneComparator
 
 
+@dataclass
+class SeriesPoint:
+    time: str
+    value: Optional[Union[int, float]]
+
+
+@dataclass
+class Metrics:
+    """
+    the total or aggregate counts (`followsAggregate`, `followsTotals`, `listenersAggregate`,
+    `listenersTotals`, `playsAggregate`, `playsTotals`, `startsAggregate`, `startsTotals`) are not useful,
+    the scraper needs to be extended to cover series as well
+    """
+
+    playsTimeSeries: Optional[List[SeriesPoint]] = None
+    startsTimeSeries: Optional[List[SeriesPoint]] = None
+    listenersTimeSeries: Optional[List[SeriesPoint]] = None
+    followsTimeSeries: Optional[List[SeriesPoint]] = None
+    engagedListenersTimeSeries: Optional[List[SeriesPoint]] = None
+
+    @staticmethod
+    def from_dict(d: Dict) -> "Metrics":
+        return Metrics(
+            **{
+                name: [SeriesPoint(row["time"], row["value"]) for row in d[name]]
+                for name in [
+                    "playsTimeSeries",
+                    "startsTimeSeries",
+                    "listenersTimeSeries",
+                    "followsTimeSeries",
+                    "engagedListenersTimeSeries",
+                ]
+                if d.get(name) is not None
+            }
+        )
+
+
+@dataclass
+class MetricsResponse:
+    data: Metrics
+
+    @staticmethod
+    def from_dict(d: Dict) -> "MetricsResponse":
+        return MetricsResponse(data=Metrics.from_dict(d["data"]))
+
+
 class Amazon(BaseNormalizationStrategy):
     def should_apply(self, meta: ResponseMeta):
         return "amazon" in meta.url
@@ -14,52 +60,47 @@ class Amazon(BaseNormalizationStrategy):
     def provider(self) -> Provider:
         return Provider.AMAZON
 
+    def metrics(self) -> List[str]:
+        return [
+            "stream_count",
+            "stream_start_count",
+            "listener_count",
+            "follower_count",
+            "engaged_listener_count",
+        ]
+
+    def schema(self, meta: ResponseMeta) -> Optional[Type]:
+        return MetricsResponse
+
     def normalize(self, by_date: Dict[str, DataPoint], response: Response) -> None:
         """
         rows look like this:
 
             {"time": "2025-07-30T00:00:00.000Z", "value": 3.0}
         """
-        data = json.loads(response.data.decode("utf-8"))["data"]
-
-        # the total or aggregate counts are not useful, the scraper needs to be extended to cover series as well
-        if "followsAggregate" in data:
-            pass
-        if "followsTotals" in data:
-            pass
-        if "listenersAggregate" in data:
-            pass
-        if "listenersTotals" in data:
-            pass
-        if "playsAggregate" in data:
-            pass
-        if "playsTotals" in data:
-            pass
-        if "startsAggregate" in data:
-            pass
-        if "playsTimeSeries" in data:
-            for row in data["playsTimeSeries"]:
-                k = row["time"][:10]
-                by_date[k].stream_count = max(by_date[k].stream_count, row["value"], key=NoneComparator)
-        if "startsTimeSeries" in data:
-            for row in data["startsTimeSeries"]:
-                k = row["time"][:10]
+        data = self._decoder.decode_as(response.data, MetricsResponse).data
+
+        if data.playsTimeSeries is not None:
+            for row in data.playsTimeSeries:
+                k = row.time[:10]
+                by_date[k].stream_count = max(by_date[k].stream_count, row.value, key=NoneComparator)
+        if data.startsTimeSeries is not None:
+            for row in data.startsTimeSeries:
+                k = row.time[:10]
                 by_date[k].stream_start_count = max(
-                    by_date[k].stream_start_count, row["value"], key=NoneComparator
+                    by_date[k].stream_start_count, row.value, key=NoneComparator
                 )
-        if "listenersTimeSeries" in data:
-            for row in data["listenersTimeSeries"]:
-                k = row["time"][:10]
-                by_date[k].listener_count = max(by_date[k].listener_count, row["value"], key=NoneComparator)
-        if "followsTimeSeries" in data:
-            for row in data["followsTimeSeries"]:
-                k = row["time"][:10]
-                by_date[k].follower_count = max(by_date[k].follower_count, row["value"], key=NoneComparator)
-        if "engagedListenersTimeSeries" in data:
-            for row in data["engagedListenersTimeSeries"]:
-                k = row["time"][:10]
+        if data.listenersTimeSeries is not None:
+            for row in data.listenersTimeSeries:
+                k = row.time[:10]
+                by_date[k].listener_count = max(by_date[k].listener_count, row.value, key=NoneComparator)
+        if data.followsTimeSeries is not None:
+            for row in data.followsTimeSeries:
+                k = row.time[:10]
+                by_date[k].follower_count = max(by_date[k].follower_count, row.value, key=NoneComparator)
+        if data.engagedListenersTimeSeries is not None:
+            for row in data.engagedListenersTimeSeries:
+                k = row.time[:10]
                 by_date[k].engaged_listener_count = max(
-                    by_date[k].engaged_listener_count, row["value"], key=NoneComparator
+                    by_date[k].engaged_listener_count, row.value, key=NoneComparator
                 )
-        if "startsTotals" in data:
-            pass
@@ -2,26 +2,33 @@
 # -*- coding: utf-8 -*-
 import abc
 import logging
-from typing import Dict
+import urllib.parse
+from typing import Dict, Optional, Type, List
 
-from lib.model import Response, DataPoint, Provider, ResponseMeta
+from lib.decoder import Decoder
+from lib.model import Response, DataPoint, Provider, ResponseMeta, DATA_POINT_METRICS
 
 
 class NoneComparator:
+    """
+    orders None before every value, so folding a 0 into a missing value keeps the 0
+    """
+
     def __init__(self, item):
         self.item = item
 
     def __lt__(self, other):
         if self.item is None:
-            return other.item
+            return other.item is not None
         if other.item is None:
-            return self.item
+            return False
         return self.item < other.item
 
 
 class BaseNormalizationStrategy(abc.ABC):
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, decoder: Optional[Decoder] = None):
         self._logger = logger
+        self._decoder = decoder or Decoder()
 
     @abc.abstractmethod
     def normalize(self, by_date: Dict[str, DataPoint], response: Response):
@@ -34,3 +41,18 @@ class BaseNormalizationStrategy(abc.ABC):
     @abc.abstractmethod
     def provider(self) -> Provider:
         raise NotImplementedError()
+
+    def metrics(self) -> List[str]:
+        """
+        the data point fields responses of this provider fill
+        """
+        return DATA_POINT_METRICS
+
+    def route(self, meta: ResponseMeta) -> str:
+        return urllib.parse.urlsplit(meta.url).path
+
+    def schema(self, meta: ResponseMeta) -> Optional[Type]:
+        """
+        the type payloads of this route are decoded into, None if the payload is not decoded into a schema
+        """
+        return None
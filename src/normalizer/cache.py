@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import logging
+import sqlite3
+from collections import defaultdict
+from typing import Optional, List, Tuple
+
+from lib.model import DataPoint, DataPointStrDict, DATA_POINT_METRICS
+
+
+class NormalizationCache:
+    """
+    persists the normalization result of single payloads across runs, entries of other normalizer versions
+    are purged when the cache is opened
+    """
+
+    def __init__(self, logger: logging.Logger, file_name: str, version: str):
+        self._logger = logger
+        self._version = version
+        self._pending: List[Tuple[str, str, str]] = []
+        self._connection = sqlite3.connect(file_name, timeout=30)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS result ("
+                "key TEXT PRIMARY KEY, "
+                "version TEXT NOT NULL, "
+                "data TEXT NOT NULL"
+                ")"
+            )
+            purged = self._connection.execute("DELETE FROM result WHERE version != ?", (version,)).rowcount
+        if purged:
+            self._logger.info(f"Purged {purged} normalization cache entries of other normalizer versions.")
+
+    def get(self, key: str) -> Optional[DataPointStrDict]:
+        row = self._connection.execute(
+            "SELECT data FROM result WHERE key = ? AND version = ?", (key, self._version)
+        ).fetchone()
+        if row is None:
+            return None
+
+        ret = defaultdict(DataPoint)
+        for date, values in json.loads(row[0]).items():
+            ret[date] = DataPoint(None, *values)
+        return ret
+
+    def put(self, key: str, by_date: DataPointStrDict):
+        data = {
+            date: [getattr(data_point, metric) for metric in DATA_POINT_METRICS]
+            for date, data_point in by_date.items()
+        }
+        self._pending.append((key, self._version, json.dumps(data, separators=(",", ":"))))
+
+    def flush(self):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO result (key, version, data) VALUES (?, ?, ?)", self._pending
+            )
+        self._pending = []
+
+
+class CacheStatistics:
+    def __init__(self):
+        self.duplicates = 0
+        self.cached = 0
+        self.normalized = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.duplicates + self.cached + self.normalized
+        return (self.duplicates + self.cached) / total if total else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.normalized} normalized, {self.duplicates} duplicate(s) skipped, "
+            f"{self.cached} from cache (hit rate {self.hit_rate:.1%})"
+        )
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os.path
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Set, DefaultDict, Optional
+
+from lib.model import Provider, DataPoint, DataPointStrDict
+from lib.responses import ResponseManager
+from normalizer.transformer import Transformer
+
+
+@dataclass
+class Checkpoint:
+    version: str
+    consumed: Set[str] = field(default_factory=set)
+    folded: Set[str] = field(default_factory=set)
+    by_provider: DefaultDict[Provider, DataPointStrDict] = field(default_factory=Transformer.empty_state)
+
+
+class CheckpointManager:
+    def __init__(self, logger: logging.Logger, file_name: str):
+        self._logger = logger
+        self._file_name = file_name
+
+    def load(self, version: str) -> Checkpoint:
+        checkpoint = Checkpoint(version=version)
+        if not os.path.exists(self._file_name):
+            self._logger.info(f"No checkpoint at {self._file_name}, starting from scratch.")
+            return checkpoint
+        with open(self._file_name, "r") as fp:
+            d = json.load(fp)
+        if d["version"] != version:
+            self._logger.info(f"Checkpoint {self._file_name} is from another normalizer version, ignoring.")
+            return checkpoint
+
+        checkpoint.consumed.update(d["consumed"])
+        checkpoint.folded.update(d["folded"])
+        for provider_value, by_date in d["by_provider"].items():
+            provider = Provider(provider_value)
+            for date, fields in by_date.items():
+                checkpoint.by_provider[provider][date] = DataPoint(
+                    provider=None if fields["provider"] is None else Provider(fields["provider"]),
+                    **{k: v for k, v in fields.items() if k != "provider"},
+                )
+        self._logger.info(f"Loaded checkpoint with {len(checkpoint.consumed)} consumed meta file(s).")
+
+        return checkpoint
+
+    def store(self, checkpoint: Checkpoint):
+        d = {
+            "version": checkpoint.version,
+            "consumed": sorted(checkpoint.consumed),
+            "folded": sorted(checkpoint.folded),
+            "by_provider": {
+                provider.value: {
+                    date: {
+                        **asdict(data_point),
+                        "provider": data_point.provider and data_point.provider.value,
+                    }
+                    for date, data_point in by_date.items()
+                }
+                for provider, by_date in checkpoint.by_provider.items()
+            },
+        }
+        tmp_file_name = f"{self._file_name}.tmp"
+        with open(tmp_file_name, "w") as fp:
+            json.dump(d, fp, sort_keys=True)
+        os.replace(tmp_file_name, self._file_name)
+        self._logger.info(f"Wrote checkpoint {self._file_name}.")
+
+
+class IncrementalNormalizer:
+    def __init__(
+        self,
+        logger: logging.Logger,
+        transformer: Transformer,
+        response_manager: ResponseManager,
+        checkpoint_manager: CheckpointManager,
+        show: Optional[str] = None,
+    ):
+        """
+        with a `show`, only responses tagged with it are folded, use one checkpoint file per show
+        """
+        self._logger = logger
+        self._transformer = transformer
+        self._response_manager = response_manager
+        self._checkpoint_manager = checkpoint_manager
+        self._show = show
+
+    def normalize(self) -> Dict[Provider, DataPointStrDict]:
+        return self._transformer.finalize(self.fold())
+
+    def fold(self) -> Dict[Provider, DataPointStrDict]:
+        checkpoint = self._checkpoint_manager.load(self._transformer.version)
+        new = list(self._response_manager.find_meta(exclude=checkpoint.consumed, show=self._show))
+        self._logger.info(
+            f"Normalizing {len(new)} new response(s) "
+            f"on top of {len(checkpoint.consumed)} checkpointed one(s)..."
+        )
+        self._transformer.fold(
+            self._response_manager.hydrate((meta for _, meta in new), ordered=False),
+            checkpoint.by_provider,
+            checkpoint.folded,
+        )
+        checkpoint.consumed.update(path for path, _ in new)
+        self._checkpoint_manager.store(checkpoint)
+
+        return checkpoint.by_provider
@@ -1,12 +1,82 @@
 # !/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import json
-from typing import Dict
+from dataclasses import dataclass
+from typing import Dict, List, Union, Optional, Type
 
 from lib.model import DataPoint, Response, Provider, ResponseMeta
 from normalizer.base import BaseNormalizationStrategy, NoneComparator
 
 
+@dataclass
+class DailyCount:
+    date: str
+    # like the json backends, typed msgspec decoding has to accept `null` and `3.0` here as well
+    count: Optional[Union[int, float]]
+
+
+@dataclass
+class Counts:
+    """
+    schema of the `followers` and `listeners` routes
+    """
+
+    counts: List[DailyCount]
+
+    @staticmethod
+    def from_dict(d: Dict) -> "Counts":
+        return Counts(counts=[DailyCount(row["date"], row["count"]) for row in d["counts"]])
+
+
+@dataclass
+class DetailedStream:
+    date: str
+    starts: Optional[Union[int, float]]
+    streams: Optional[Union[int, float]]
+
+
+@dataclass
+class DetailedStreams:
+    detailedStreams: List[DetailedStream]
+
+    @staticmethod
+    def from_dict(d: Dict) -> "DetailedStreams":
+        return DetailedStreams(
+            detailedStreams=[
+                DetailedStream(row["date"], row["starts"], row["streams"]) for row in d["detailedStreams"]
+            ]
+        )
+
+
+@dataclass
+class DailyConsumption:
+    date: str
+    totalConsumptionHours: Union[int, float]
+    foregroundConsumptionHours: Union[int, float]
+
+
+@dataclass
+class Consumption:
+    """
+    schema of the `consumption/daily` route
+    """
+
+    consumptionTimes: List[DailyConsumption]
+
+    @staticmethod
+    def from_dict(d: Dict) -> "Consumption":
+        return Consumption(
+            consumptionTimes=[
+                DailyConsumption(
+                    row["date"],
+                    row["totalConsumptionHours"],
+                    row["foregroundConsumptionHours"],
+                )
+                for row in d["consumptionTimes"]
+            ]
+        )
+
+
 class Spotify(BaseNormalizationStrategy):
     def should_apply(self, meta: ResponseMeta):
         return "spotify" in meta.url
@@ -14,8 +84,29 @@ class Spotify(BaseNormalizationStrategy):
     def provider(self) -> Provider:
         return Provider.SPOTIFY
 
+    def metrics(self) -> List[str]:
+        return [
+            "follower_count",
+            "listener_count",
+            "consumption_seconds",
+            "foreground_consumption_seconds",
+            "stream_count",
+            "stream_start_count",
+        ]
+
+    def route(self, meta: ResponseMeta) -> str:
+        return "/".join(meta.url.split("/")[7:]).split("?")[0]
+
+    def schema(self, meta: ResponseMeta) -> Optional[Type]:
+        return {
+            "consumption/daily": Consumption,
+            "followers": Counts,
+            "listeners": Counts,
+            "detailedStreams": DetailedStreams,
+        }.get(self.route(meta))
+
     def normalize(self, by_date: Dict[str, DataPoint], response: Response) -> None:
-        api_route = "/".join(response.meta.url.split("/")[7:]).split("?")[0]
+        api_route = self.route(response.meta)
         if any(
             api_route == s
             for s in ["metadata", "seamless_switch", "onboarding", "followersDelta", "onSpotifyOverview"]
@@ -24,50 +115,50 @@ class Spotify(BaseNormalizationStrategy):
         if api_route.endswith("/latest") or api_route.endswith("/total"):
             return
 
-        data = json.loads(response.data.decode("utf-8"))
         if api_route == "consumption/daily":
-            for row in data["consumptionTimes"]:
-                k = row["date"]
+            for row in self._decoder.decode_as(response.data, Consumption).consumptionTimes:
+                k = row.date
                 by_date[k].consumption_seconds = max(
                     by_date[k].consumption_seconds,
-                    int(row["totalConsumptionHours"] * 60 * 60),
+                    int(row.totalConsumptionHours * 60 * 60),
                     key=NoneComparator,
                 )
                 by_date[k].foreground_consumption_seconds = max(
                     by_date[k].foreground_consumption_seconds,
-                    int(row["foregroundConsumptionHours"] * 60 * 60),
+                    int(row.foregroundConsumptionHours * 60 * 60),
                     key=NoneComparator,
                 )
         elif api_route == "followers":
-            for row in data["counts"]:
-                k = row["date"]
+            for row in self._decoder.decode_as(response.data, Counts).counts:
+                k = row.date
                 by_date[k].follower_count = max(
                     by_date[k].follower_count,
-                    row["count"],
+                    row.count,
                     key=NoneComparator,
                 )
         elif api_route == "listeners":
-            for row in data["counts"]:
-                k = row["date"]
+            for row in self._decoder.decode_as(response.data, Counts).counts:
+                k = row.date
                 by_date[k].listener_count = max(
                     by_date[k].listener_count,
-                    row["count"],
+                    row.count,
                     key=NoneComparator,
                 )
         elif api_route == "detailedStreams":
-            for row in data["detailedStreams"]:
-                k = row["date"]
+            for row in self._decoder.decode_as(response.data, DetailedStreams).detailedStreams:
+                k = row.date
                 by_date[k].stream_start_count = max(
                     by_date[k].stream_start_count,
-                    row["starts"],
+                    row.starts,
                     key=NoneComparator,
                 )
                 by_date[k].stream_count = max(
                     by_date[k].stream_count,
-                    row["streams"],
+                    row.streams,
                     key=NoneComparator,
                 )
         else:
+            data = self._decoder.decode(response.data)
             self._logger.warning(
                 f"Unknown API route {api_route} (keys={data.keys}): {json.dumps(data)[:200]}"
             )
@@ -1,43 +1,278 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import inspect
+import itertools
 import logging
+import os
+from array import array
 from collections import defaultdict
-from typing import Iterable, Dict
+from typing import Iterable, Dict, Optional, DefaultDict, List, Set, Tuple, Union
 
-from lib.model import Response, DataPoint, Provider, DataPointStrDict
+from lib import model, decoder
+from lib.decoder import Decoder
+from lib.model import Response, DataPoint, Provider, DataPointStrDict, DATA_POINT_METRICS
+from lib.series import ColumnarStore, ProviderSeries, Column, to_ordinal
+from normalizer import base
 from normalizer.amazon import Amazon
+from normalizer.base import NoneComparator, BaseNormalizationStrategy
+from normalizer.cache import NormalizationCache, CacheStatistics
 from normalizer.spotify import Spotify
 
+_worker_transformer: Optional["Transformer"] = None
+
+
+def _init_worker(json_backend: Optional[str]):
+    global _worker_transformer
+    _worker_transformer = Transformer(logging.getLogger(), json_backend=json_backend)
+
+
+def _fold_chunk(
+    responses: List[Response], per_response: bool
+) -> Union[Dict[Provider, Dict[str, DataPoint]], List[Tuple[Provider, Dict[str, DataPoint]]]]:
+    if per_response:
+        return [_worker_transformer.normalize_single(response) for response in responses]
+    return _worker_transformer.fold_partial(responses)
+
 
 class Transformer:
-    def __init__(self, logger: logging.Logger):
+    def __init__(
+        self,
+        logger: logging.Logger,
+        processes: int = 1,
+        chunk_size: int = 64,
+        cache_file_name: Optional[str] = None,
+        json_backend: Optional[str] = None,
+    ):
+        """
+        with more than one process, responses are folded in chunks of `chunk_size` by a process pool and the
+        partial results are merged, which yields the same result because the fold is a per-field maximum
+
+        `cache_file_name` persists the normalization result of every payload across runs, `json_backend`
+        defaults to the fastest installed one
+        """
         self._logger = logger
+        self._processes = processes or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._cache_file_name = cache_file_name
         self._state = {}
+        self._json_backend = json_backend
+        self._decoder = Decoder(json_backend)
         self._strategies = [
-            Spotify(self._logger),
-            Amazon(self._logger),
+            Spotify(self._logger, self._decoder),
+            Amazon(self._logger, self._decoder),
         ]
 
-    def normalize(self, responses: Iterable[Response]) -> Dict[Provider, DataPointStrDict]:
-        by_provider = defaultdict(lambda: defaultdict(DataPoint))
+    @functools.cached_property
+    def version(self) -> str:
+        """
+        changes whenever the normalization code or the set of strategies changes, used to invalidate
+        persisted normalization state
+        """
+        h = hashlib.sha256()
+        # backends differ in the types they decode numbers into
+        h.update(f"{self._decoder.backend}\n".encode("utf-8"))
+        for strategy in self._strategies:
+            h.update(f"{strategy.__class__.__module__}.{strategy.__class__.__name__}\n".encode("utf-8"))
+        for file_name in sorted(
+            {__file__}
+            | {inspect.getsourcefile(m) for m in [model, decoder, base]}
+            | {inspect.getsourcefile(strategy.__class__) for strategy in self._strategies}
+        ):
+            with open(file_name, "rb") as fp:
+                h.update(fp.read())
+        return h.hexdigest()
+
+    @functools.cached_property
+    def _cache(self) -> Optional[NormalizationCache]:
+        if self._cache_file_name is None:
+            return None
+        return NormalizationCache(self._logger, self._cache_file_name, self.version)
+
+    @staticmethod
+    def empty_state() -> DefaultDict[Provider, DataPointStrDict]:
+        return defaultdict(lambda: defaultdict(DataPoint))
+
+    def strategy(self, provider: Provider) -> BaseNormalizationStrategy:
+        for strategy in self._strategies:
+            if strategy.provider() == provider:
+                return strategy
+        raise ValueError(f"No strategy for provider {provider.value}")
+
+    def route(self, response: Response) -> BaseNormalizationStrategy:
+        for strategy in self._strategies:
+            if strategy.should_apply(response.meta):
+                return strategy
+        raise ValueError(f"Cannot route response: {response}")
+
+    @staticmethod
+    def _key(strategy: BaseNormalizationStrategy, response: Response) -> str:
+        # strategies may route by URL, so identical payloads from different endpoints are kept apart
+        route = (response.meta.url or "").split("?")[0]
+        return f"{response.meta.sha256}:{strategy.__class__.__name__}:{route}"
+
+    def fold_partial(self, responses: Iterable[Response]) -> Dict[Provider, Dict[str, DataPoint]]:
+        """
+        folds without deduplication and caching into plain (picklable) dicts
+        """
+        by_provider = self.empty_state()
         for response in responses:
-            for strategy in self._strategies:
-                if strategy.should_apply(response.meta):
+            strategy = self.route(response)
+            strategy.normalize(by_provider[strategy.provider()], response)
+        return {provider: dict(by_date) for provider, by_date in by_provider.items()}
+
+    def normalize_single(self, response: Response) -> Tuple[Provider, DataPointStrDict]:
+        strategy = self.route(response)
+        by_date = defaultdict(DataPoint)
+        strategy.normalize(by_date, response)
+        return strategy.provider(), by_date
+
+    def normalize(self, responses: Iterable[Response]) -> Dict[Provider, DataPointStrDict]:
+        return self.finalize(self.fold(responses))
+
+    def fold(
+        self,
+        responses: Iterable[Response],
+        by_provider: Optional[DefaultDict[Provider, DataPointStrDict]] = None,
+        folded: Optional[Set[str]] = None,
+    ) -> DefaultDict[Provider, DataPointStrDict]:
+        """
+        `folded` holds the keys of all payloads already contained in `by_provider`, folding a payload twice
+        doesn't change the maximum, so those are skipped
+        """
+        if by_provider is None:
+            by_provider = self.empty_state()
+        if folded is None:
+            folded = set()
+        statistics = CacheStatistics()
+        to_normalize = self._deduplicate(responses, by_provider, folded, statistics)
+        if self._processes > 1:
+            self._fold_parallel(to_normalize, by_provider, statistics)
+        else:
+            for strategy, key, response in to_normalize:
+                statistics.normalized += 1
+                if self._cache is None:
                     strategy.normalize(by_provider[strategy.provider()], response)
-                    break
-            else:
-                raise ValueError(f"Cannot route response: {response}")
+                else:
+                    provider, by_date = self.normalize_single(response)
+                    self._cache.put(key, by_date)
+                    self.merge(by_provider, {provider: by_date})
+        if self._cache is not None:
+            self._cache.flush()
+        self._logger.info(f"Folded responses: {statistics}")
 
-        for provider in by_provider.keys():
-            by_provider[provider] = self._normalize_to_cumulative(provider, by_provider[provider])
-            by_provider[provider] = self._populate_provider(provider, by_provider[provider])
-            by_provider[provider] = self._filter_all_none(by_provider[provider])
+        return by_provider
+
+    def _deduplicate(
+        self,
+        responses: Iterable[Response],
+        by_provider: DefaultDict[Provider, DataPointStrDict],
+        folded: Set[str],
+        statistics: CacheStatistics,
+    ) -> Iterable[Tuple[BaseNormalizationStrategy, str, Response]]:
+        for response in responses:
+            strategy = self.route(response)
+            key = self._key(strategy, response)
+            if key in folded:
+                statistics.duplicates += 1
+                continue
+            folded.add(key)
+            if self._cache is not None:
+                by_date = self._cache.get(key)
+                if by_date is not None:
+                    statistics.cached += 1
+                    self.merge(by_provider, {strategy.provider(): by_date})
+                    continue
+            yield strategy, key, response
+
+    def _fold_parallel(
+        self,
+        to_normalize: Iterable[Tuple[BaseNormalizationStrategy, str, Response]],
+        by_provider: DefaultDict[Provider, DataPointStrDict],
+        statistics: CacheStatistics,
+    ):
+        per_response = self._cache is not None
 
-        for empty_key in [k for k, v in by_provider.items() if len(v) == 0]:
-            del by_provider[empty_key]
+        def complete(future: concurrent.futures.Future, keys: List[str]):
+            if not per_response:
+                self.merge(by_provider, future.result())
+                return
+            for key, (provider, by_date) in zip(keys, future.result()):
+                self._cache.put(key, by_date)
+                self.merge(by_provider, {provider: by_date})
+
+        to_normalize = iter(to_normalize)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._processes, initializer=_init_worker, initargs=(self._json_backend,)
+        ) as executor:
+            pending = collections.deque()
+            while chunk := list(itertools.islice(to_normalize, self._chunk_size)):
+                statistics.normalized += len(chunk)
+                if len(pending) >= 2 * self._processes:
+                    complete(*pending.popleft())
+                pending.append(
+                    (
+                        executor.submit(_fold_chunk, [response for _, _, response in chunk], per_response),
+                        [key for _, key, _ in chunk],
+                    )
+                )
+            while pending:
+                complete(*pending.popleft())
+
+    @staticmethod
+    def merge(
+        by_provider: DefaultDict[Provider, DataPointStrDict], partial: Dict[Provider, DataPointStrDict]
+    ) -> DefaultDict[Provider, DataPointStrDict]:
+        for provider, by_date in partial.items():
+            target_by_date = by_provider[provider]
+            for date, data_point in by_date.items():
+                target = target_by_date[date]
+                for metric in DATA_POINT_METRICS:
+                    value = getattr(data_point, metric)
+                    # folding in None would reset the value, see NoneComparator
+                    if value is not None:
+                        setattr(target, metric, max(getattr(target, metric), value, key=NoneComparator))
 
         return by_provider
 
+    def finalize(self, by_provider: Dict[Provider, DataPointStrDict]) -> Dict[Provider, DataPointStrDict]:
+        ret = {}
+        for provider, by_date in by_provider.items():
+            by_date = self._normalize_to_cumulative(provider, by_date)
+            by_date = self._populate_provider(provider, by_date)
+            by_date = self._filter_all_none(by_date)
+            if len(by_date) > 0:
+                ret[provider] = by_date
+
+        return ret
+
+    def finalize_columnar(self, by_provider: Dict[Provider, DataPointStrDict]) -> ColumnarStore:
+        """
+        same result as `finalize`, but cumulative sums are computed per column with `itertools.accumulate`
+        instead of copying a data point per date
+        """
+        ret = {}
+        for provider, by_date in by_provider.items():
+            items = [(date, point) for date, point in sorted(by_date.items()) if not point.no_data_set]
+            if len(items) == 0:
+                continue
+            columns = {}
+            for metric in DATA_POINT_METRICS:
+                values = [getattr(point, metric) for _, point in items]
+                if provider not in [Provider.SPOTIFY, Provider.AMAZON]:
+                    columns[metric] = Column.from_values(values)
+                elif provider == Provider.SPOTIFY and metric == "follower_count":
+                    columns[metric] = Column.dense([v or 0 for v in values])
+                else:
+                    columns[metric] = Column.dense(list(itertools.accumulate(v or 0 for v in values)))
+            days = array("l", (to_ordinal(date) for date, _ in items))
+            ret[provider] = ProviderSeries(provider, days, columns)
+
+        return ColumnarStore(ret)
+
     @staticmethod
     def _normalize_to_cumulative(provider: Provider, by_date: DataPointStrDict) -> DataPointStrDict:
         if provider not in [Provider.SPOTIFY, Provider.AMAZON]:
@@ -47,7 +282,7 @@ class Transformer:
 
         cumulative_data_point = DataPoint(next(iter(by_date.values())).provider, 0, 0, 0, 0, 0, 0, 0)
         ret = {}
-        for k, v in by_date.items():
+        for k, v in sorted(by_date.items()):
             if v.no_data_set:
                 continue
             if provider == Provider.AMAZON:
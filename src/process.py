@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import argparse
-import json
 import os
+import sys
 
 from lib.chart_js import ChartJsJsonGenerator
-from lib.factory import LoggerFactory, KeyFactory
+from lib.decoder import Decoder, BACKENDS
+from lib.elastic import BulkEncoder, BulkSender, BulkWriter
+from lib.factory import LoggerFactory
+from lib.feed import FeedEventsRepository
+from lib.meta_index import MetaIndex
 from lib.model import Provider
+from lib.output import JsonOutputWriter
 from lib.repository import (
     FollowerRepository,
     ListenerRepository,
@@ -14,10 +19,13 @@ from lib.repository import (
     StreamRepository,
     StreamStartRepository,
     EngagedListenerRepository,
+    RepositoryIndex,
     EventsRepository,
+    MergedEventsRepository,
 )
 from lib.responses import ResponseManager
 from lib.validator import Validator
+from normalizer.checkpoint import CheckpointManager, IncrementalNormalizer
 from normalizer.transformer import Transformer
 
 
@@ -26,12 +34,84 @@ def main():
     parser.add_argument("--debug", "-d", action="store_true")
     parser.add_argument("--meta-dir", default=os.getenv("META_DIR"))
     parser.add_argument("--payload-dir", default=os.getenv("PAYLOAD_DIR"))
+    parser.add_argument("--meta-index-file-name", default=os.getenv("META_INDEX_FILE_NAME"))
+    parser.add_argument("--hydration-workers", type=int, default=int(os.getenv("HYDRATION_WORKERS", "1")))
+    parser.add_argument("--read-ahead", type=int, default=int(os.getenv("READ_AHEAD", "64")))
+    parser.add_argument(
+        "--normalization-processes",
+        type=int,
+        default=int(os.getenv("NORMALIZATION_PROCESSES", "1")),
+        help="0 uses all cores",
+    )
+    parser.add_argument("--checkpoint-file-name", default=os.getenv("CHECKPOINT_FILE_NAME"))
+    parser.add_argument(
+        "--show", default=os.getenv("SHOW"), help="only process responses tagged with this show"
+    )
+    parser.add_argument("--json-backend", default=os.getenv("JSON_BACKEND"), choices=BACKENDS)
+    parser.add_argument(
+        "--normalization-cache-file-name", default=os.getenv("NORMALIZATION_CACHE_FILE_NAME")
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        default=bool(os.getenv("COLUMNAR")),
+        help="keep normalized data in per-metric arrays",
+    )
     parser.add_argument("--event-marker-file-name", default=os.getenv("EVENT_MARKER_FILE_NAME"))
+    parser.add_argument(
+        "--rss-feed", default=os.getenv("RSS_FEED"), help="podcast feed file name or URL, marks episodes"
+    )
+    parser.add_argument("--rss-feed-cache-file-name", default=os.getenv("RSS_FEED_CACHE_FILE_NAME"))
+    parser.add_argument(
+        "--rss-feed-max-age",
+        type=float,
+        default=float(os.getenv("RSS_FEED_MAX_AGE", "3600")),
+        help="seconds before a cached feed is downloaded again",
+    )
     parser.add_argument(
         "--output-strategy",
         default=os.getenv("OUTPUT_STRATEGY", "chartjs"),
         choices=["elastic", "chartjs"],
     )
+    parser.add_argument(
+        "--compact-charts",
+        action="store_true",
+        default=bool(os.getenv("COMPACT_CHARTS")),
+        help="minified chart configs sharing the dates in labels.json",
+    )
+    parser.add_argument(
+        "--max-chart-points",
+        type=int,
+        default=int(os.getenv("MAX_CHART_POINTS", "0")),
+        help="downsample longer series with largest-triangle-three-buckets, 0 keeps every day",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        default=bool(os.getenv("PRECOMPRESS")),
+        help="write .gz and .br files next to every JSON file",
+    )
+    parser.add_argument(
+        "--versioned-output",
+        action="store_true",
+        default=bool(os.getenv("VERSIONED_OUTPUT")),
+        help="additionally write every JSON file under a name containing its hash, listed in manifest.json",
+    )
+    parser.add_argument(
+        "--elastic-url",
+        default=os.getenv("ELASTIC_URL"),
+        help="send documents to the _bulk API below this URL instead of printing them as NDJSON",
+    )
+    parser.add_argument("--elastic-index", default=os.getenv("ELASTIC_INDEX", "sonifree"))
+    parser.add_argument(
+        "--elastic-batch-size", type=int, default=int(os.getenv("ELASTIC_BATCH_SIZE", "500"))
+    )
+    parser.add_argument(
+        "--elastic-max-in-flight",
+        type=int,
+        default=int(os.getenv("ELASTIC_MAX_IN_FLIGHT", "2")),
+        help="batches sent at once, producing further batches waits for them",
+    )
     parser.add_argument(
         "--json-result-dir",
         default=os.getenv(
@@ -41,85 +121,123 @@ def main():
     args = parser.parse_args()
 
     logger = LoggerFactory.get(args.debug)
-    transformer = Transformer(logger)
+    transformer = Transformer(
+        logger,
+        processes=args.normalization_processes,
+        cache_file_name=args.normalization_cache_file_name,
+        json_backend=args.json_backend,
+    )
     validator = Validator(logger)
-    response_manager = ResponseManager(args.meta_dir, args.payload_dir)
-    by_provider = transformer.normalize(response_manager.find())
-    by_date = transformer.provider_to_date_flip(by_provider)
-    validator.validate(by_date)
+    response_manager = ResponseManager(
+        args.meta_dir,
+        args.payload_dir,
+        MetaIndex(args.meta_index_file_name) if args.meta_index_file_name else None,
+        workers=args.hydration_workers,
+        read_ahead=args.read_ahead,
+        decoder=Decoder(args.json_backend),
+    )
+    if args.show is None:
+        # a per-day maximum across shows looks plausible but is wrong
+        shows = response_manager.shows()
+        if len(shows) > 1:
+            parser.error(
+                f"responses of several shows are stored ({', '.join(sorted(shows))}), select one with --show"
+            )
+    if args.checkpoint_file_name:
+        folded = IncrementalNormalizer(
+            logger,
+            transformer,
+            response_manager,
+            CheckpointManager(logger, args.checkpoint_file_name),
+            args.show,
+        ).fold()
+    else:
+        folded = transformer.fold(response_manager.find(ordered=False, show=args.show))
+    if not any(folded.values()):
+        scope = f" tagged with show {args.show}" if args.show else ""
+        logger.error(f"No responses found{scope}, not writing any output.")
+        sys.exit(1)
+    if args.columnar:
+        by_provider = transformer.finalize_columnar(folded)
+        validation_report = validator.validate_columnar(by_provider)
+    else:
+        by_provider = transformer.finalize(folded)
+        validation_report = validator.validate(by_provider)
 
     event_repository = EventsRepository(args.event_marker_file_name)
-    follower_repository = FollowerRepository(by_provider)
-    listener_repository = ListenerRepository(by_provider)
-    engaged_listener_repository = EngagedListenerRepository(by_provider)
-    consumption_repository = ConsumptionRepository(by_provider)
-    stream_repository = StreamRepository(by_provider)
-    stream_start_repository = StreamStartRepository(by_provider)
-    char_generator = ChartJsJsonGenerator(transformer)
+    if args.rss_feed:
+        event_repository = MergedEventsRepository(
+            event_repository,
+            FeedEventsRepository(
+                logger, args.rss_feed, args.rss_feed_cache_file_name, args.rss_feed_max_age
+            ),
+        )
+    repository_index = RepositoryIndex(by_provider)
+    follower_repository = FollowerRepository(by_provider, repository_index)
+    listener_repository = ListenerRepository(by_provider, repository_index)
+    engaged_listener_repository = EngagedListenerRepository(by_provider, repository_index)
+    consumption_repository = ConsumptionRepository(by_provider, repository_index)
+    stream_repository = StreamRepository(by_provider, repository_index)
+    stream_start_repository = StreamStartRepository(by_provider, repository_index)
+    char_generator = ChartJsJsonGenerator(transformer, args.compact_charts, args.max_chart_points or None)
 
     events = event_repository.all()
     if args.output_strategy == "chartjs":
-        for file_name, config in [
-            (
-                "follower_count.json",
-                char_generator.generate("Follower Count", follower_repository, events),
-            ),
-            (
-                "listener_count.json",
-                char_generator.generate("Listener Count", listener_repository, events),
-            ),
-            (
-                "engaged_listener_count.json",
-                char_generator.generate("Engaged Listener Count", engaged_listener_repository, events),
-            ),
-            (
-                "consumption_seconds.json",
-                char_generator.generate("Consumption Seconds", consumption_repository, events),
+        outputs = {
+            "labels.json": char_generator.labels(follower_repository),
+            "follower_count.json": char_generator.generate("Follower Count", follower_repository, events),
+            "listener_count.json": char_generator.generate("Listener Count", listener_repository, events),
+            "engaged_listener_count.json": char_generator.generate(
+                "Engaged Listener Count", engaged_listener_repository, events
             ),
-            (
-                "stream_count.json",
-                char_generator.generate("Stream Count", stream_repository, events),
+            "consumption_seconds.json": char_generator.generate(
+                "Consumption Seconds", consumption_repository, events
             ),
-            (
-                "stream_start_count.json",
-                char_generator.generate("Stream Starts", stream_start_repository, events),
+            "stream_count.json": char_generator.generate("Stream Count", stream_repository, events),
+            "stream_start_count.json": char_generator.generate(
+                "Stream Starts", stream_start_repository, events
             ),
-        ]:
-            json_file_name = os.path.join(args.json_result_dir, file_name)
-            with open(json_file_name, "w") as fp:
-                json.dump(config, fp, indent=4)
-            logger.info(f"Wrote {json_file_name}.")
+        }
 
-        json_file_name = os.path.join(args.json_result_dir, "aggregates.json")
-        with open(json_file_name, "w") as fp:
-            aggregates = {
-                "sum": {
-                    "followers": follower_repository.sum(),
-                    "listeners": listener_repository.sum(),
-                    "consumed": consumption_repository.sum(),
-                    "streams": stream_repository.sum(),
-                },
-                "by_provider": {},
+        aggregates = {
+            "sum": {
+                "followers": follower_repository.sum(),
+                "listeners": listener_repository.sum(),
+                "consumed": consumption_repository.sum(),
+                "streams": stream_repository.sum(),
+            },
+            "by_provider": {},
+        }
+        for provider in Provider:
+            aggregates["by_provider"][provider.value] = {
+                "followers": follower_repository.sum_by_provider(provider),
+                "listeners": listener_repository.sum_by_provider(provider),
+                "engaged_listeners": engaged_listener_repository.sum_by_provider(provider),
+                "consumed": consumption_repository.sum_by_provider(provider),
+                "streams": stream_repository.sum_by_provider(provider),
+                "last_date": follower_repository.last_date_of_provider(provider),
             }
-            for provider in Provider:
-                aggregates["by_provider"][provider.value] = {
-                    "followers": follower_repository.sum_by_provider(provider),
-                    "listeners": listener_repository.sum_by_provider(provider),
-                    "engaged_listeners": engaged_listener_repository.sum_by_provider(provider),
-                    "consumed": consumption_repository.sum_by_provider(provider),
-                    "streams": stream_repository.sum_by_provider(provider),
-                    "last_date": follower_repository.last_date_of_provider(provider),
-                }
-            json.dump(aggregates, fp, indent=4)
-        logger.info(f"Wrote {json_file_name}.")
+        outputs["aggregates.json"] = aggregates
+        outputs["validation.json"] = validation_report.dict()
+        writer = JsonOutputWriter(
+            logger, args.json_result_dir, args.compact_charts, args.precompress, args.versioned_output
+        )
+        writer.write_many(outputs)
 
     elif args.output_strategy == "elastic":
-        for date in sorted(by_date.keys()):
-            for provider, point in by_date[date].items():
-                data = point.dict
-                data["_id"] = KeyFactory.for_state(provider, date)
-                data["date"] = date
-                print(json.dumps(data, indent=4, sort_keys=True))
+        by_date = transformer.provider_to_date_flip(
+            by_provider.to_data_points() if args.columnar else by_provider
+        )
+        if args.elastic_url:
+            sender = BulkSender(
+                logger,
+                f"{args.elastic_url.rstrip('/')}/_bulk",
+                os.getenv("ELASTIC_API_KEY"),
+                args.elastic_max_in_flight,
+            )
+        else:
+            sender = BulkWriter(sys.stdout.buffer)
+        sender.send(BulkEncoder(args.elastic_index, args.elastic_batch_size, args.show).batches(by_date))
 
 
 if __name__ == "__main__":
@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 import argparse
 import os
+import sys
 
+from lib.decoder import Decoder, BACKENDS
 from lib.factory import LoggerFactory
+from lib.meta_index import MetaIndex
 from lib.model import Provider
 from lib.repository import (
     FollowerRepository,
@@ -12,9 +15,11 @@ from lib.repository import (
     StreamRepository,
     StreamStartRepository,
     EngagedListenerRepository,
+    RepositoryIndex,
 )
 from lib.responses import ResponseManager
 from lib.validator import Validator
+from normalizer.checkpoint import CheckpointManager, IncrementalNormalizer
 from normalizer.transformer import Transformer
 
 
@@ -23,6 +28,29 @@ def main():
     parser.add_argument("--debug", "-d", action="store_true")
     parser.add_argument("--meta-dir", default=os.getenv("META_DIR"))
     parser.add_argument("--payload-dir", default=os.getenv("PAYLOAD_DIR"))
+    parser.add_argument("--meta-index-file-name", default=os.getenv("META_INDEX_FILE_NAME"))
+    parser.add_argument("--hydration-workers", type=int, default=int(os.getenv("HYDRATION_WORKERS", "1")))
+    parser.add_argument("--read-ahead", type=int, default=int(os.getenv("READ_AHEAD", "64")))
+    parser.add_argument(
+        "--normalization-processes",
+        type=int,
+        default=int(os.getenv("NORMALIZATION_PROCESSES", "1")),
+        help="0 uses all cores",
+    )
+    parser.add_argument("--checkpoint-file-name", default=os.getenv("CHECKPOINT_FILE_NAME"))
+    parser.add_argument(
+        "--show", default=os.getenv("SHOW"), help="only process responses tagged with this show"
+    )
+    parser.add_argument("--json-backend", default=os.getenv("JSON_BACKEND"), choices=BACKENDS)
+    parser.add_argument(
+        "--normalization-cache-file-name", default=os.getenv("NORMALIZATION_CACHE_FILE_NAME")
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        default=bool(os.getenv("COLUMNAR")),
+        help="keep normalized data in per-metric arrays",
+    )
     parser.add_argument(
         "--provider",
         default=os.getenv("PROVIDER", Provider.SPOTIFY.value),
@@ -37,19 +65,56 @@ def main():
     args = parser.parse_args()
 
     logger = LoggerFactory.get(args.debug)
-    transformer = Transformer(logger)
+    transformer = Transformer(
+        logger,
+        processes=args.normalization_processes,
+        cache_file_name=args.normalization_cache_file_name,
+        json_backend=args.json_backend,
+    )
     validator = Validator(logger)
-    response_manager = ResponseManager(args.meta_dir, args.payload_dir)
-    by_provider = transformer.normalize(response_manager.find())
-    by_date = transformer.provider_to_date_flip(by_provider)
-    validator.validate(by_date)
+    response_manager = ResponseManager(
+        args.meta_dir,
+        args.payload_dir,
+        MetaIndex(args.meta_index_file_name) if args.meta_index_file_name else None,
+        workers=args.hydration_workers,
+        read_ahead=args.read_ahead,
+        decoder=Decoder(args.json_backend),
+    )
+    if args.show is None:
+        # a per-day maximum across shows looks plausible but is wrong
+        shows = response_manager.shows()
+        if len(shows) > 1:
+            parser.error(
+                f"responses of several shows are stored ({', '.join(sorted(shows))}), select one with --show"
+            )
+    if args.checkpoint_file_name:
+        folded = IncrementalNormalizer(
+            logger,
+            transformer,
+            response_manager,
+            CheckpointManager(logger, args.checkpoint_file_name),
+            args.show,
+        ).fold()
+    else:
+        folded = transformer.fold(response_manager.find(ordered=False, show=args.show))
+    if not any(folded.values()):
+        scope = f" tagged with show {args.show}" if args.show else ""
+        logger.error(f"No responses found{scope}.")
+        sys.exit(1)
+    if args.columnar:
+        by_provider = transformer.finalize_columnar(folded)
+        validator.validate_columnar(by_provider)
+    else:
+        by_provider = transformer.finalize(folded)
+        validator.validate(by_provider)
 
-    follower_repository = FollowerRepository(by_provider)
-    listener_repository = ListenerRepository(by_provider)
-    engaged_listener_repository = EngagedListenerRepository(by_provider)
-    consumption_repository = ConsumptionRepository(by_provider)
-    stream_repository = StreamRepository(by_provider)
-    stream_start_repository = StreamStartRepository(by_provider)
+    repository_index = RepositoryIndex(by_provider)
+    follower_repository = FollowerRepository(by_provider, repository_index)
+    listener_repository = ListenerRepository(by_provider, repository_index)
+    engaged_listener_repository = EngagedListenerRepository(by_provider, repository_index)
+    consumption_repository = ConsumptionRepository(by_provider, repository_index)
+    stream_repository = StreamRepository(by_provider, repository_index)
+    stream_start_repository = StreamStartRepository(by_provider, repository_index)
     repositories = {
         "follower": follower_repository,
         "listener": listener_repository,
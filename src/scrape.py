@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import argparse
+import datetime
 import os
+import sys
 
-from anticaptchaofficial.recaptchav2proxyless import recaptchaV2Proxyless
-
-from lib.factory import LoggerFactory
-from lib.model import SpotifyConfig, AmazonConfig
+from lib.coverage import ScrapeWindowPlanner
+from lib.factory import LoggerFactory, ScraperConfigFactory
+from lib.meta_index import MetaIndex
+from lib.model import SpotifyConfig, AmazonConfig, Provider
+from lib.payload_store import PayloadStoreFactory, COMPRESSIONS
 from lib.responses import ResponseManager
-from lib.scraper import SeleniumFactory
+from lib.runner import ConcurrentScraperRunner, job_name
+from lib.scraper import SeleniumFactory, RecaptchaSolverFactory
+from lib.telemetry import ScraperTelemetry, TelemetryWriter
+from normalizer.transformer import Transformer
 from scraper.amazon import Amazon
 from scraper.spotify import Spotify
 
@@ -19,7 +25,79 @@ def main():
     parser.add_argument("--chrome-executable-path", default=os.getenv("CHROME_EXECUTABLE_PATH"))
     parser.add_argument("--meta-dir", default=os.getenv("META_DIR"))
     parser.add_argument("--payload-dir", default=os.getenv("PAYLOAD_DIR"))
+    parser.add_argument("--meta-index-file-name", default=os.getenv("META_INDEX_FILE_NAME"))
+    parser.add_argument(
+        "--payload-store", default=os.getenv("PAYLOAD_STORE", "files"), choices=["files", "segments"]
+    )
+    parser.add_argument(
+        "--payload-compression", default=os.getenv("PAYLOAD_COMPRESSION", "none"), choices=COMPRESSIONS
+    )
+    parser.add_argument("--browser-profile-dir", default=os.getenv("BROWSER_PROFILE_DIR"))
+    parser.add_argument(
+        "--logout",
+        action="store_true",
+        default=bool(os.getenv("LOGOUT")),
+        help="log out after scraping even with a persistent browser profile",
+    )
+    parser.add_argument(
+        "--direct-fetch",
+        action="store_true",
+        default=bool(os.getenv("DIRECT_FETCH")),
+        help="fetch analytics endpoints with the session of the browser instead of clicking through charts",
+    )
+    parser.add_argument(
+        "--lightweight-browser",
+        action="store_true",
+        default=bool(os.getenv("LIGHTWEIGHT_BROWSER")),
+        help="headless Chrome, no images, fonts and trackers, only network events in the performance log",
+    )
+    parser.add_argument(
+        "--blocked-url-pattern",
+        action="append",
+        help=f"replaces BLOCKED_URL_PATTERNS and the default patterns "
+        f"{','.join(SeleniumFactory.BLOCKED_URL_PATTERNS)}",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=bool(os.getenv("INCREMENTAL")),
+        help="only fetch dates since the last stored ones, the full history on the first run or after a gap",
+    )
+    parser.add_argument(
+        "--overlap-days",
+        type=int,
+        default=int(os.getenv("INCREMENTAL_OVERLAP_DAYS", "7")),
+        help="days before the last stored date fetched again in incremental mode",
+    )
+    parser.add_argument(
+        "--lookback-days",
+        type=int,
+        default=int(os.getenv("INCREMENTAL_LOOKBACK_DAYS", "90")),
+        help="age of the stored responses checked for the last dates and gaps in incremental mode",
+    )
+    parser.add_argument(
+        "--telemetry-dir",
+        default=os.getenv("TELEMETRY_DIR"),
+        help="write durations of all scraper phases as JSON and as Prometheus textfile into this directory",
+    )
+    parser.add_argument(
+        "--scraper-config-file-name",
+        default=os.getenv("SCRAPER_CONFIG_FILE_NAME"),
+        help="JSON file with accounts and their shows, replaces the user name, password and podcast options",
+    )
     parser.add_argument("--filter-scraper")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("SCRAPER_CONCURRENCY", "0")),
+        help="number of scrapers running at once in worker processes, 0 runs them in-process one by one",
+    )
+    parser.add_argument(
+        "--scraper-timeout",
+        type=float,
+        default=float(os.getenv("SCRAPER_TIMEOUT", "600")),
+        help="seconds after which a worker process gets terminated",
+    )
     parser.add_argument("--spotify-user-name", default=os.getenv("SPOTIFY_USER_NAME"))
     parser.add_argument("--spotify-password", default=os.getenv("SPOTIFY_PASSWORD"))
     parser.add_argument("--spotify-podcast-id", default=os.getenv("SPOTIFY_PODCAST_ID"))
@@ -29,45 +107,114 @@ def main():
     parser.add_argument("--amazon-user-name", default=os.getenv("AMAZON_USER_NAME"))
     parser.add_argument("--amazon-password", default=os.getenv("AMAZON_PASSWORD"))
     args = parser.parse_args()
+    if args.blocked_url_pattern is None:
+        args.blocked_url_pattern = [p for p in os.getenv("BLOCKED_URL_PATTERNS", "").split(",") if p] or None
+    started = datetime.datetime.now(datetime.timezone.utc)
     logger = LoggerFactory.get(args.debug)
-    response_manager = ResponseManager(args.meta_dir, args.payload_dir)
-    selenium_factory = SeleniumFactory(args.chrome_executable_path)
+    telemetry_writer = TelemetryWriter(logger, args.telemetry_dir) if args.telemetry_dir else None
+    response_manager = ResponseManager(
+        args.meta_dir,
+        args.payload_dir,
+        MetaIndex(args.meta_index_file_name) if args.meta_index_file_name else None,
+        PayloadStoreFactory.get(args.payload_dir, args.payload_store, args.payload_compression),
+    )
+    selenium_factory = SeleniumFactory(
+        args.chrome_executable_path,
+        args.browser_profile_dir,
+        args.logout,
+        args.lightweight_browser,
+        args.blocked_url_pattern,
+    )
     anticaptcha_api_key = os.getenv("ANTICAPTCHA_API_KEY")
-    if anticaptcha_api_key:
-        recaptcha_solver = recaptchaV2Proxyless()
-        recaptcha_solver.set_verbose(1)
-        recaptcha_solver.set_key(anticaptcha_api_key)
+    if args.scraper_config_file_name:
+        scraper_classes = {SpotifyConfig: Spotify, AmazonConfig: Amazon}
+        scraper_configs = [
+            (scraper_classes[config.__class__], config)
+            for config in ScraperConfigFactory.from_file(args.scraper_config_file_name)
+        ]
     else:
-        recaptcha_solver = None
-    scraper_configs = [
-        (Spotify, SpotifyConfig(args.spotify_user_name, args.spotify_password, args.spotify_podcast_id)),
-        # (Apple, AppleConfig(args.apple_user_name, args.apple_password, args.apple_podcast_id)),
-        (Amazon, AmazonConfig(args.amazon_user_name, args.amazon_password)),
-    ]
+        scraper_configs = [
+            (Spotify, SpotifyConfig(args.spotify_user_name, args.spotify_password, args.spotify_podcast_id)),
+            # (Apple, AppleConfig(args.apple_user_name, args.apple_password, args.apple_podcast_id)),
+            (Amazon, AmazonConfig(args.amazon_user_name, args.amazon_password)),
+        ]
 
     logger.info(f"Found {len(scraper_configs)} configured scraper(s)")
     scraper_filter = args.filter_scraper
     if scraper_filter:
         logger.info(f"This is a filtered run: {scraper_filter}")
-    for scraper_cls, scraper_config in scraper_configs:
-        scraper_name = scraper_cls.__name__
-        logger.info(f"Running {scraper_name}...")
-        if scraper_filter and scraper_filter != scraper_name:
-            logger.info(f"Skipping {scraper_name}.")
-            continue
-        scraper = scraper_cls(
-            logger=logger,
-            selenium_factory=selenium_factory,
-            config=scraper_config,
-            recaptcha_solver=recaptcha_solver,
-            name=scraper_cls.__name__,
+        scraper_configs = [
+            (cls, conf)
+            for cls, conf in scraper_configs
+            if scraper_filter in [cls.__name__, job_name(cls, conf)]
+        ]
+
+    date_ranges = {}
+    if args.incremental:
+        planner = ScrapeWindowPlanner(
+            logger, Transformer(logger), response_manager, args.overlap_days, args.lookback_days
+        )
+        for scraper_cls, config in scraper_configs:
+            name = scraper_cls.__name__
+            date_ranges[job_name(scraper_cls, config)] = {
+                show.tag: planner.plan(name, Provider(name), show=show.tag) for show in config.shows
+            }
+
+    if args.concurrency > 0:
+        runner = ConcurrentScraperRunner(
+            logger,
+            response_manager,
+            selenium_factory,
+            anticaptcha_api_key,
+            args.concurrency,
+            args.scraper_timeout,
+            args.debug,
+            {"direct_fetch": args.direct_fetch},
+        )
+        results = runner.run(
+            scraper_configs, {name: {"date_ranges": ranges} for name, ranges in date_ranges.items()}
         )
-        scraper.prepare()
-        responses = list(scraper.extract_payloads())
-        scraper.postprocess()
-        logger.info(f"Got {len(responses)} response(s)")
-        for response in responses:
-            response_manager.store(scraper, response)
+        runner.summarize(results)
+        if telemetry_writer is not None:
+            telemetry_writer.write([result.telemetry for result in results], started)
+        logger.info("Scraping completed, shutting down...")
+        if not all(result.succeeded for result in results):
+            sys.exit(1)
+        return
+
+    recaptcha_solver = RecaptchaSolverFactory.get(anticaptcha_api_key)
+    telemetries = []
+    try:
+        for scraper_cls, scraper_config in scraper_configs:
+            name = job_name(scraper_cls, scraper_config)
+            logger.info(f"Running {name}...")
+            telemetry = ScraperTelemetry(name)
+            telemetries.append(telemetry)
+            scraper = scraper_cls(
+                logger=logger,
+                selenium_factory=selenium_factory,
+                config=scraper_config,
+                recaptcha_solver=recaptcha_solver,
+                name=scraper_cls.__name__,
+                direct_fetch=args.direct_fetch,
+                date_ranges=date_ranges.get(name),
+                telemetry=telemetry,
+                profile_name=name,
+            )
+            try:
+                responses = list(scraper.run())
+            finally:
+                # quits the browser
+                scraper.close()
+            logger.info(f"Got {len(responses)} response(s)")
+            with telemetry.phase("store") as timing:
+                response_manager.store_many((scraper.name, response) for response in responses)
+                for response in responses:
+                    timing.add(response)
+    finally:
+        # also written if a scraper failed
+        if telemetry_writer is not None:
+            telemetry_writer.write(telemetries, started)
     logger.info("Scraping completed, shutting down...")
 
 
@@ -1,17 +1,28 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
 import logging
-import time
-from typing import Iterable, Optional
+import re
+from typing import Iterable, Optional, Dict
 
 from anticaptchaofficial.recaptchav2proxyless import recaptchaV2Proxyless
 from selenium.webdriver.common.by import By
 
-from lib.model import AmazonConfig, Response
-from lib.scraper import SeleniumFactory, Selenium, Scraper
+from lib.fetcher import DirectFetcher
+from lib.model import AmazonConfig, Response, DateRange, ShowConfig
+from lib.scraper import SeleniumFactory, Selenium, Scraper, ScraperException
+from lib.telemetry import ScraperTelemetry
 
 
 class Amazon(Selenium, Scraper):
+    # every diagram loads its series from below this route
+    EXPECTED_RESPONSE = r"/metrics/podcast"
+    # series of the diagrams, fetched directly below the `metrics/podcast` URL the dashboard requested
+    SERIES = ["plays", "starts", "listeners", "engagedListeners", "follows"]
+    # preset time frames ending today by number of days, anything longer is fetched as "All time"
+    TIME_FRAMES = [(7, "LAST_7_DAYS"), (30, "LAST_30_DAYS"), (90, "LAST_90_DAYS")]
+    PODCAST_URL = "https://podcasters.amazon.com/podcasts/{podcast_id}"
+
     def __init__(
         self,
         logger: logging.Logger,
@@ -19,13 +30,42 @@ class Amazon(Selenium, Scraper):
         config: AmazonConfig,
         recaptcha_solver: Optional[recaptchaV2Proxyless],
         name: str,
+        direct_fetch: bool = False,
+        date_ranges: Optional[Dict[Optional[str], DateRange]] = None,
+        telemetry: Optional[ScraperTelemetry] = None,
+        profile_name: Optional[str] = None,
     ):
+        """
+        all shows of the account are scraped one after another with a single login, for shows with a date
+        range in `date_ranges` (by show tag) the smallest preset time frame covering it is fetched directly
+        instead of the "All time" chart
+        """
         super().__init__(
-            logger=logger, selenium_factory=selenium_factory, recaptcha_solver=recaptcha_solver, name=name
+            logger=logger,
+            selenium_factory=selenium_factory,
+            name=name,
+            recaptcha_solver=recaptcha_solver,
+            telemetry=telemetry,
+            profile_name=profile_name,
         )
         self._config = config
+        self._direct_fetch = direct_fetch
+        self._date_ranges = date_ranges or {}
+        self._show: ShowConfig = config.shows[0]
 
     def prepare(self):
+        if self._keep_session and self._session_valid(
+            "https://podcasters.amazon.com/podcasts",
+            (By.CLASS_NAME, "TimeFrame__dropdown-button"),
+            "amazon.com/ap/signin",
+        ):
+            self._logger.info(f"{self.__class__.__name__} ➤ Reusing session...")
+        else:
+            with self.telemetry.phase("login"):
+                self._login()
+        self._record_page_load()
+
+    def _login(self):
         self._logger.info(f"{self.__class__.__name__} ➤ Logging in...")
         self._selenium.get(
             "https://www.amazon.com/ap/signin?openid.ns=http://specs.openid.net/auth/2.0&openid.claimed_id=http://specs.openid.net/auth/2.0/identifier_select&openid.identity=http://specs.openid.net/auth/2.0/identifier_select&pageId=amzn_ziggy_ui&openid.assoc_handle=amzn_podcaster_portal_us&language=en_US&openid.mode=checkid_setup&openid.return_to=https://podcasters.amazon.com/auth/csrf?path=https://podcasters.amazon.com/podcasts"
@@ -48,51 +88,106 @@ class Amazon(Selenium, Scraper):
         login_button.click()
 
     def extract_payloads(self) -> Iterable[Response]:
+        for show in self._config.shows:
+            self._show = show
+            for response in self._extract_show():
+                response.meta.show = show.tag
+                yield response
+
+    @property
+    def _date_range(self) -> Optional[DateRange]:
+        return self._date_ranges.get(self._show.tag)
+
+    def _metrics_pattern(self) -> str:
+        # without an ID, everything the dashboard loads belongs to the show it opened with
+        if self._show.show_id is None:
+            return self.EXPECTED_RESPONSE
+        return rf"{self.EXPECTED_RESPONSE}/{re.escape(self._show.show_id)}"
+
+    def _extract_show(self) -> Iterable[Response]:
+        if self._direct_fetch or self._date_range is not None:
+            yield from self._fetch_directly()
+            return
+
         self._logger.info(f"{self.__class__.__name__} ➤ Switch to all time chart...")
-        dropdown_button = self._selenium.find_element(By.CLASS_NAME, "TimeFrame__dropdown-button")
-        self._wait_until(dropdown_button)
-        dropdown_button.click()
+        with self.telemetry.phase("chart_navigation"):
+            if self._show.show_id is not None:
+                self._selenium.get(self.PODCAST_URL.format(podcast_id=self._show.show_id))
+            dropdown_button = self._selenium.find_element(By.CLASS_NAME, "TimeFrame__dropdown-button")
+            self._wait_until(dropdown_button)
+            dropdown_button.click()
 
-        item = self._selenium.find_element(
-            By.CSS_SELECTOR,
-            '[data-id="selectTimeFrameAllTime-podcasterAnalyticsOverview"]',
-        )
-        self._wait_until(item)
+            item = self._selenium.find_element(
+                By.CSS_SELECTOR,
+                '[data-id="selectTimeFrameAllTime-podcasterAnalyticsOverview"]',
+            )
+            self._wait_until(item)
 
         self._flush_performance_log()
-        item.click()
+        with self._capture(self._metrics_pattern()) as capture:
+            item.click()
 
-        self._logger.info(f"{self.__class__.__name__} ➤ Cycling through all diagrams...")
-        diagram_button = self._selenium.find_element(
-            By.CSS_SELECTOR, 'music-button[data-id="selectAnalyticsTypeDropdown-podcasterAnalyticsOverview"]'
-        )
-        self._wait_until(diagram_button)
-        # data-ids
-        for diagram_name, data_id in (
-            ("Starts", "selectAnalyticsTypeDropdownStarts-podcasterAnalyticsOverview"),
-            ("Plays", "selectAnalyticsTypeDropdownPlays-podcasterAnalyticsOverview"),
-            ("Listeners", "selectAnalyticsTypeDropdownListeners-podcasterAnalyticsOverview"),
-            ("Engaged Listeners", "selectAnalyticsTypeDropdownEngagedListeners-podcasterAnalyticsOverview"),
-            ("Followers", "selectAnalyticsTypeDropdownFollowers-podcasterAnalyticsOverview"),
-        ):
-            self._logger.info(f"{self.__class__.__name__} ➤ Open diagram {repr(diagram_name)}...")
-            diagram_button.click()
-            pulldown_option = self._selenium.find_element(By.CSS_SELECTOR, f'button[data-id="{data_id}"]')
-            self._wait_until(pulldown_option)
-            pulldown_option.click()
-
-            time.sleep(1)
-
-        for message in self._get_performance_log_response_messages():
-            url = self._get_performance_log_url(message)
-            if "metrics/podcast" not in url:
-                continue
-            body = self._get_performance_log_body(message)
-            if body is None:
-                continue
-            yield Response.from_dict(body, url)
+            self._logger.info(f"{self.__class__.__name__} ➤ Cycling through all diagrams...")
+            diagram_button = self._selenium.find_element(
+                By.CSS_SELECTOR,
+                'music-button[data-id="selectAnalyticsTypeDropdown-podcasterAnalyticsOverview"]',
+            )
+            self._wait_until(diagram_button)
+            # data-ids
+            for diagram_name, data_id in (
+                ("Starts", "selectAnalyticsTypeDropdownStarts-podcasterAnalyticsOverview"),
+                ("Plays", "selectAnalyticsTypeDropdownPlays-podcasterAnalyticsOverview"),
+                ("Listeners", "selectAnalyticsTypeDropdownListeners-podcasterAnalyticsOverview"),
+                (
+                    "Engaged Listeners",
+                    "selectAnalyticsTypeDropdownEngagedListeners-podcasterAnalyticsOverview",
+                ),
+                ("Followers", "selectAnalyticsTypeDropdownFollowers-podcasterAnalyticsOverview"),
+            ):
+                self._logger.info(f"{self.__class__.__name__} ➤ Open diagram {repr(diagram_name)}...")
+                with self.telemetry.phase("chart_navigation"):
+                    diagram_button.click()
+                    pulldown_option = self._selenium.find_element(
+                        By.CSS_SELECTOR, f'button[data-id="{data_id}"]'
+                    )
+                    self._wait_until(pulldown_option)
+                    pulldown_option.click()
+                with self.telemetry.phase("capture"):
+                    yield from capture.stream([self._metrics_pattern()])
+            # whatever finished after the last diagram
+            with self.telemetry.phase("capture"):
+                yield from capture.stream()
+
+    def _fetch_directly(self) -> Iterable[Response]:
+        with self.telemetry.phase("export_session"):
+            session, urls = self._export_session(self.EXPECTED_RESPONSE)
+            if not urls:
+                self._wait_for_responses([self.EXPECTED_RESPONSE])
+                session, urls = self._export_session(self.EXPECTED_RESPONSE)
+        if not urls:
+            raise ScraperException("Dashboard didn't request any metrics, cannot fetch directly.")
+        # e.g. https://podcasters.amazon.com/api/metrics/podcast/<podcast id>/<series>?..., the session works
+        # for every show of the account
+        prefix, podcast_id = re.match(rf"(.*{self.EXPECTED_RESPONSE}/)([^/?]+)", urls[-1]).groups()
+        base_url = f"{prefix}{self._show.show_id or podcast_id}"
+        time_frame = self._time_frame()
+        self._logger.info(f"{self.__class__.__name__} ➤ Fetching series of {time_frame} directly...")
+        with self.telemetry.phase("direct_fetch"):
+            yield from DirectFetcher(self._logger, session).fetch(
+                f"{base_url}/{series}?timeFrame={time_frame}" for series in self.SERIES
+            )
+
+    def _time_frame(self) -> str:
+        if self._date_range is None or self._date_range.end < datetime.date.today():
+            return "ALL_TIME"
+        for days, time_frame in self.TIME_FRAMES:
+            if self._date_range.days <= days:
+                return time_frame
+        return "ALL_TIME"
 
     def postprocess(self):
+        if self._keep_session:
+            return
         self._selenium.get(
             "https://www.amazon.com/ap/signin?openid.ns=http://specs.openid.net/auth/2.0&openid.claimed_id=http://specs.openid.net/auth/2.0/identifier_select&openid.identity=http://specs.openid.net/auth/2.0/identifier_select&pageId=amzn_ziggy_ui&openid.assoc_handle=amzn_podcaster_portal_us&language=en_US&openid.mode=logout&openid.return_to=https://podcasters.amazon.com"
         )
@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
 import logging
+import re
 import time
 import urllib.parse
-from typing import Optional
+from typing import Optional, List, Iterable, Dict
 
 from anticaptchaofficial.recaptchav2proxyless import recaptchaV2Proxyless
 from selenium.common import NoSuchElementException
 from selenium.webdriver.common.by import By
 
-from lib.model import SpotifyConfig, Response
+from lib.fetcher import DirectFetcher
+from lib.model import SpotifyConfig, Response, DateRange, ShowConfig
 from lib.scraper import Selenium, Scraper, SeleniumFactory, ScraperException
+from lib.telemetry import ScraperTelemetry
 
 
 class Spotify(Selenium, Scraper):
+    # analytics routes the "All time" chart loads, below `shows/<podcast id>/`
+    EXPECTED_ROUTES = ["followers", "listeners", "detailedStreams", "consumption/daily"]
+    # used for direct fetching unless the dashboard requested another API base, the "All time" chart starts
+    # before Spotify hosted podcasts
+    API_URL = "https://generic.wg.spotify.com/podcasters/v0"
+    ALL_TIME_START = "2015-01-01"
+
     def __init__(
         self,
         logger: logging.Logger,
@@ -21,47 +32,114 @@ class Spotify(Selenium, Scraper):
         config: SpotifyConfig,
         recaptcha_solver: Optional[recaptchaV2Proxyless],
         name: str,
+        direct_fetch: bool = False,
+        date_ranges: Optional[Dict[Optional[str], DateRange]] = None,
+        telemetry: Optional[ScraperTelemetry] = None,
+        profile_name: Optional[str] = None,
     ):
+        """
+        all shows of the account are scraped one after another with a single login, for shows with a date
+        range in `date_ranges` (by show tag) only those dates are fetched directly instead of the "All time"
+        chart
+        """
         super().__init__(
-            logger=logger, selenium_factory=selenium_factory, name=name, recaptcha_solver=recaptcha_solver
+            logger=logger,
+            selenium_factory=selenium_factory,
+            name=name,
+            recaptcha_solver=recaptcha_solver,
+            telemetry=telemetry,
+            profile_name=profile_name,
         )
         self._config = config
+        self._direct_fetch = direct_fetch
+        self._date_ranges = date_ranges or {}
+        self._show: ShowConfig = config.shows[0]
 
     def prepare(self):
-        self._login()
-
-    def extract_payloads(self):
-        self._logger.info(f"{self.__class__.__name__} ➤ Switch to all time chart...")
-        dropdown_element = self._selenium.find_element(
-            By.CSS_SELECTOR, "#dropdown-toggle-spotify-stats-chart-date"
+        if self._keep_session and self._session_valid(
+            self._podcast_url(),
+            (By.CSS_SELECTOR, "#dropdown-toggle-spotify-stats-chart-date"),
+            "accounts.spotify.com",
+        ):
+            self._logger.info(f"{self.__class__.__name__} ➤ Reusing session...")
+        else:
+            with self.telemetry.phase("login"):
+                self._login()
+        self._record_page_load()
+
+    def extract_payloads(self) -> Iterable[Response]:
+        for show in self._config.shows:
+            self._show = show
+            for response in self._extract_show():
+                response.meta.show = show.tag
+                yield response
+
+    @property
+    def _date_range(self) -> Optional[DateRange]:
+        return self._date_ranges.get(self._show.tag)
+
+    def _extract_show(self) -> Iterable[Response]:
+        if self._direct_fetch or self._date_range is not None:
+            yield from self._fetch_directly()
+            return
+
+        self._logger.info(
+            f"{self.__class__.__name__} ➤ Switch to all time chart of show {self._show.show_id}..."
         )
-        self._wait_until(dropdown_element)
-
-        dropdown_element.click()
-        element = self._selenium.find_element(By.CSS_SELECTOR, "#allTime")
-        self._wait_until(element)
+        with self.telemetry.phase("chart_navigation"):
+            if self._selenium.current_url != self._podcast_url():
+                self._selenium.get(self._podcast_url())
+            dropdown_element = self._selenium.find_element(
+                By.CSS_SELECTOR, "#dropdown-toggle-spotify-stats-chart-date"
+            )
+            self._wait_until(dropdown_element)
+
+            dropdown_element.click()
+            element = self._selenium.find_element(By.CSS_SELECTOR, "#allTime")
+            self._wait_until(element)
 
         self._flush_performance_log()
-        element.click()
-        time.sleep(1)
-
-        self._logger.info(f"{self.__class__.__name__} ➤ Capturing responses...")
-        response_messages = self._get_performance_log_response_messages()
-        for message in response_messages:
-            url = self._get_performance_log_url(message)
-            if self._config.podcast_id not in url:
-                continue
-            body = self._get_performance_log_body(message)
-            if body is None:
-                continue
-            yield Response.from_dict(body, url)
+        with self.telemetry.phase("capture"), self._capture(re.escape(self._show.show_id)) as capture:
+            element.click()
+            self._logger.info(f"{self.__class__.__name__} ➤ Capturing responses...")
+            yield from capture.stream(self.expected_responses())
+
+    def _fetch_directly(self) -> Iterable[Response]:
+        # the session works for every show of the account, whichever show the dashboard requested
+        pattern = r"/shows/[^/]+/"
+        with self.telemetry.phase("export_session"):
+            session, urls = self._export_session(pattern)
+            if not urls:
+                self._wait_for_responses([pattern])
+                session, urls = self._export_session(pattern)
+        api_url = urls[0].split("/shows/")[0] if urls else self.API_URL
+        if self._date_range is None:
+            start, end = self.ALL_TIME_START, datetime.date.today().isoformat()
+        else:
+            start, end = self._date_range.start.isoformat(), self._date_range.end.isoformat()
+        query = urllib.parse.urlencode({"start": start, "end": end})
+        self._logger.info(f"{self.__class__.__name__} ➤ Fetching analytics routes for {start}..{end}...")
+        with self.telemetry.phase("direct_fetch"):
+            yield from DirectFetcher(self._logger, session).fetch(
+                f"{api_url}/shows/{self._show.show_id}/{route}?{query}" for route in self.EXPECTED_ROUTES
+            )
+
+    def expected_responses(self) -> List[str]:
+        return [
+            rf"/shows/{re.escape(self._show.show_id)}/{re.escape(route)}(\?|$)"
+            for route in self.EXPECTED_ROUTES
+        ]
 
     def postprocess(self):
-        self._logout()
+        if not self._keep_session:
+            self._logout()
+
+    def _podcast_url(self) -> str:
+        return f"https://creators.spotify.com/dash/show/{self._show.show_id}/analytics/overview"
 
     def _login(self):
         self._logger.info(f"{self.__class__.__name__} ➤ Logging in...")
-        podcast_url = f"https://creators.spotify.com/dash/show/{self._config.podcast_id}/analytics/overview"
+        podcast_url = self._podcast_url()
         self._selenium.get(
             f"https://accounts.spotify.com/en/login"
             f"?login_hint={urllib.parse.quote_plus(self._config.user_name)}"
@@ -76,62 +154,65 @@ class Spotify(Selenium, Scraper):
         login_button = self._selenium.find_element(By.ID, "login-button")
         self._wait_until(login_button)
         login_button.click()
-        time.sleep(2)
+        self._wait_for(self._login_submitted)
 
         if self._recaptcha_verification():
-            self._logger.info(f"{self.__class__.__name__} ➤ Checking for human validation...")
-            if self._recaptcha_solver:
-                sitekey = self._selenium.find_element(By.CLASS_NAME, "g-recaptcha").get_attribute(
-                    "data-sitekey"
-                )
-                for iframe_no, iframe in enumerate(self._selenium.find_elements(By.TAG_NAME, "iframe")):
-                    self._logger.debug(f"{self.__class__.__name__} ➤ checking iframe {iframe_no}")
-                    try:
-                        if not iframe.get_property("src").startswith("https://www.google.com/recaptcha/"):
-                            continue
-                    except NoSuchElementException as e:
-                        self._logger.debug(
-                            f"{self.__class__.__name__} ➤ iframe {iframe_no} doesn't have a src attribute"
-                        )
+            with self.telemetry.phase("captcha"):
+                self._solve_recaptcha(podcast_url)
+
+    def _solve_recaptcha(self, podcast_url: str):
+        self._logger.info(f"{self.__class__.__name__} ➤ Checking for human validation...")
+        if self._recaptcha_solver:
+            sitekey = self._selenium.find_element(By.CLASS_NAME, "g-recaptcha").get_attribute("data-sitekey")
+            for iframe_no, iframe in enumerate(self._selenium.find_elements(By.TAG_NAME, "iframe")):
+                self._logger.debug(f"{self.__class__.__name__} ➤ checking iframe {iframe_no}")
+                try:
+                    if not iframe.get_property("src").startswith("https://www.google.com/recaptcha/"):
                         continue
-
-                    self._selenium.switch_to.frame(iframe)
-
-                    captcha_response_fields = self._selenium.find_elements(By.ID, "g-recaptcha-response")
-                    checkboxs = self._selenium.find_elements(By.CLASS_NAME, "rc-anchor-content")
-                    if len(captcha_response_fields) != 1 and len(checkboxs) != 1:
-                        captcha_response_field = captcha_response_fields[0]
-                        checkbox = checkboxs[0]
-                        self._recaptcha_solver.set_website_url(podcast_url)
-                        self._recaptcha_solver.set_website_key(sitekey)
-
-                        # captcha_response = self._recaptcha_solver.solve_and_return_solution()
-                        # if captcha_response == 0:
-                        #     raise ScraperException(
-                        #         f"Got error from anti-captcha ({self._recaptcha_solver.error_code}): "
-                        #         f"{self._recaptcha_solver.err_string}"
-                        #     )
-
-                        self._selenium.execute_script(
-                            "document.getElementById('g-recaptcha-response').style.display = '';"
-                        )
-                        import IPython
-
-                        IPython.embed()
-                        captcha_response_field.send_keys(self._config.password)
-
-                        self._wait_until(checkbox)
-                        checkbox.click()
-                        self._selenium.switch_to.default_content()
-                        break
-                else:
-                    raise ScraperException("Expected reCaptcha to exist but couldn't find it")
+                except NoSuchElementException:
+                    self._logger.debug(
+                        f"{self.__class__.__name__} ➤ iframe {iframe_no} doesn't have a src attribute"
+                    )
+                    continue
+
+                self._selenium.switch_to.frame(iframe)
+
+                captcha_response_fields = self._selenium.find_elements(By.ID, "g-recaptcha-response")
+                checkboxs = self._selenium.find_elements(By.CLASS_NAME, "rc-anchor-content")
+                if len(captcha_response_fields) != 1 and len(checkboxs) != 1:
+                    captcha_response_field = captcha_response_fields[0]
+                    checkbox = checkboxs[0]
+                    self._recaptcha_solver.set_website_url(podcast_url)
+                    self._recaptcha_solver.set_website_key(sitekey)
+
+                    # captcha_response = self._recaptcha_solver.solve_and_return_solution()
+                    # if captcha_response == 0:
+                    #     raise ScraperException(
+                    #         f"Got error from anti-captcha ({self._recaptcha_solver.error_code}): "
+                    #         f"{self._recaptcha_solver.err_string}"
+                    #     )
+
+                    self._selenium.execute_script(
+                        "document.getElementById('g-recaptcha-response').style.display = '';"
+                    )
+                    captcha_response_field.send_keys(self._config.password)
+
+                    self._wait_until(checkbox)
+                    checkbox.click()
+                    self._selenium.switch_to.default_content()
+                    break
             else:
-                self._logger.info(
-                    f"{self.__class__.__name__} ➤ No anti-captcha API key supplied, waiting for manual solve..."
-                )
-                while self._recaptcha_verification():
-                    time.sleep(1)
+                raise ScraperException("Expected reCaptcha to exist but couldn't find it")
+        else:
+            self._logger.info(
+                f"{self.__class__.__name__} ➤ No anti-captcha API key supplied, waiting for manual solve..."
+            )
+            while self._recaptcha_verification():
+                time.sleep(1)
+
+    def _login_submitted(self) -> bool:
+        # either redirected to the analytics page or stopped by the captcha
+        return "accounts.spotify.com" not in self._selenium.current_url or self._recaptcha_verification()
 
     def _recaptcha_verification(self) -> bool:
         body = self._selenium.find_element(By.TAG_NAME, "body")
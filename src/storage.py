@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import datetime
+import os
+
+from lib.factory import LoggerFactory
+from lib.meta_index import MetaIndex
+from lib.payload_store import SegmentPayloadStore, COMPRESSIONS
+from lib.responses import ResponseManager
+
+
+def utc_datetime(s: str) -> datetime.datetime:
+    ret = datetime.datetime.fromisoformat(s)
+    if ret.tzinfo is None:
+        ret = ret.replace(tzinfo=datetime.timezone.utc)
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", "-d", action="store_true")
+    parser.add_argument("--meta-dir", default=os.getenv("META_DIR"))
+    parser.add_argument("--payload-dir", default=os.getenv("PAYLOAD_DIR"))
+    parser.add_argument("--meta-index-file-name", default=os.getenv("META_INDEX_FILE_NAME"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild-index", help="regenerate the meta index from the meta directory")
+    list_parser = subparsers.add_parser("list", help="list stored responses")
+    list_parser.add_argument("--scraper")
+    list_parser.add_argument("--url-pattern")
+    list_parser.add_argument("--since", type=utc_datetime)
+    list_parser.add_argument("--until", type=utc_datetime)
+    list_parser.add_argument("--show")
+    migrate_parser = subparsers.add_parser(
+        "migrate-payloads", help="move payload files into segment files, in place"
+    )
+    migrate_parser.add_argument("--compression", default="none", choices=COMPRESSIONS)
+    compact_parser = subparsers.add_parser(
+        "compact-payloads", help="rewrite segment files, optionally recompressing and dropping payloads"
+    )
+    compact_parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        help="recompress all payloads, otherwise each one keeps its compression",
+    )
+    compact_parser.add_argument(
+        "--drop-unreferenced", action="store_true", help="drop payloads no meta file refers to"
+    )
+    args = parser.parse_args()
+
+    logger = LoggerFactory.get(args.debug)
+    response_manager = ResponseManager(
+        args.meta_dir,
+        args.payload_dir,
+        MetaIndex(args.meta_index_file_name) if args.meta_index_file_name else None,
+    )
+
+    if args.command == "rebuild-index":
+        count = response_manager.rebuild_index()
+        logger.info(f"Indexed {count} meta file(s) into {args.meta_index_file_name}.")
+    elif args.command == "list":
+        for _, meta in response_manager.find_meta(
+            scraper_name=args.scraper,
+            url_pattern=args.url_pattern,
+            since=args.since,
+            until=args.until,
+            show=args.show,
+        ):
+            print(meta.timestamp.isoformat(), meta.sha256, meta.url)
+    elif args.command == "migrate-payloads":
+        count = SegmentPayloadStore(args.payload_dir, args.compression).migrate()
+        logger.info(f"Migrated {count} payload(s) into segments.")
+    elif args.command == "compact-payloads":
+        keep = {meta.sha256 for _, meta in response_manager.find_meta()} if args.drop_unreferenced else None
+        kept, dropped = SegmentPayloadStore(args.payload_dir, args.compression or "none").compact(
+            keep, recompress=args.compression is not None
+        )
+        logger.info(f"Compacted segments, kept {kept} and dropped {dropped} payload(s).")
+
+
+if __name__ == "__main__":
+    main()